@@ -0,0 +1,375 @@
+# =========================
+# 本機假 Notion API（壓測用）
+# 只實作 gallery.py 用到的端點：
+#   POST  /databases/{id}/query   分頁、filter、sorts
+#   GET   /databases/{id}         schema
+#   GET   /pages/{id}
+#   POST  /pages                  新增
+#   PATCH /pages/{id}             更新
+# =========================
+import json
+import random
+import socket
+import threading
+import uuid
+from datetime import date, datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+BOOK_DB = "bench-books"
+LOG_DB = "bench-logs"
+TODO_DB = "bench-todos"
+
+STATUSES = ["想讀", "閱讀中", "已讀"]
+CATEGORIES = ["文學", "商業", "科學", "歷史", "藝術", "心理", "科技", "旅遊"]
+GENRES = ["小說", "散文", "傳記", "工具書", "漫畫"]
+TAGS = ["推薦", "經典", "重讀", "入門", "進階", "電子書", "借閱", "收藏"]
+WORDS = ["時間", "海", "城市", "旅人", "夜", "花園", "記憶", "光", "學習", "設計", "Python", "Data", "History", "Mind", "Code"]
+
+def iso(dt):
+    return dt.strftime("%Y-%m-%dT%H:%M:00.000Z")
+
+def rich(text):
+    return [{"type": "text", "plain_text": text, "text": {"content": text}}]
+
+def options(names):
+    return {"options": [{"name": n} for n in names]}
+
+# =========================
+# 假資料產生
+# =========================
+BOOK_SCHEMA = {
+    "名稱": {"type": "title", "title": {}},
+    "作者": {"type": "rich_text", "rich_text": {}},
+    "閱讀狀態": {"type": "select", "select": options(STATUSES)},
+    "分類": {"type": "select", "select": options(CATEGORIES)},
+    "類別": {"type": "select", "select": options(GENRES)},
+    "分類標籤": {"type": "multi_select", "multi_select": options(TAGS)},
+    "封面": {"type": "url", "url": {}},
+    "出版社": {"type": "rich_text", "rich_text": {}},
+    "出版年": {"type": "number", "number": {}},
+    "ISBN": {"type": "rich_text", "rich_text": {}},
+    "頁數": {"type": "number", "number": {}},
+    "簡介": {"type": "rich_text", "rich_text": {}},
+    "開始閱讀": {"type": "date", "date": {}},
+    "讀完日期": {"type": "date", "date": {}},
+    "PDF": {"type": "files", "files": {}},
+}
+LOG_SCHEMA = {
+    "名稱": {"type": "title", "title": {}},
+    "日期": {"type": "date", "date": {}},
+    "頁數": {"type": "number", "number": {}},
+    "分鐘數": {"type": "number", "number": {}},
+    "書籍關聯": {"type": "relation", "relation": {}},
+}
+TODO_SCHEMA = {
+    "名稱": {"type": "title", "title": {}},
+    "是否完成": {"type": "checkbox", "checkbox": {}},
+    "截止日": {"type": "date", "date": {}},
+}
+
+def make_page(page_id, stamp, properties):
+    return {
+        "object": "page",
+        "id": page_id,
+        "created_time": stamp,
+        "last_edited_time": stamp,
+        "archived": False,
+        "cover": None,
+        "properties": properties,
+    }
+
+def make_book(rng, i, stamp):
+    title = " ".join(rng.sample(WORDS, 3)) + f" {i}"
+    started = date(2020, 1, 1) + timedelta(days=rng.randrange(2000))
+    return make_page(
+        f"book-{i}",
+        stamp,
+        {
+            "名稱": {"type": "title", "title": rich(title)},
+            "作者": {"type": "rich_text", "rich_text": rich(f"作者{rng.randrange(max(i // 5, 1) + 1)}")},
+            "閱讀狀態": {"type": "select", "select": {"name": rng.choice(STATUSES)}},
+            "分類": {"type": "select", "select": {"name": rng.choice(CATEGORIES)}},
+            "類別": {"type": "select", "select": {"name": rng.choice(GENRES)}},
+            "分類標籤": {"type": "multi_select", "multi_select": [{"name": t} for t in rng.sample(TAGS, rng.randrange(4))]},
+            "封面": {"type": "url", "url": None},
+            "出版社": {"type": "rich_text", "rich_text": rich(f"出版社{rng.randrange(50)}")},
+            "出版年": {"type": "number", "number": rng.randrange(1950, 2026)},
+            "ISBN": {"type": "rich_text", "rich_text": rich(f"978{rng.randrange(10**9, 10**10)}")},
+            "頁數": {"type": "number", "number": rng.randrange(80, 900)},
+            "簡介": {"type": "rich_text", "rich_text": rich("，".join(rng.sample(WORDS, 6)))},
+            "開始閱讀": {"type": "date", "date": {"start": started.isoformat()}},
+            "讀完日期": {"type": "date", "date": None},
+            "PDF": {"type": "files", "files": []},
+        },
+    )
+
+def make_log(rng, i, day, stamp, nbooks):
+    return make_page(
+        f"log-{i}",
+        stamp,
+        {
+            "名稱": {"type": "title", "title": rich(f"Log {day.isoformat()}")},
+            "日期": {"type": "date", "date": {"start": day.isoformat()}},
+            "頁數": {"type": "number", "number": rng.randrange(5, 80)},
+            "分鐘數": {"type": "number", "number": rng.randrange(10, 120)},
+            "書籍關聯": {"type": "relation", "relation": [{"id": f"book-{rng.randrange(max(nbooks, 1))}"}]},
+        },
+    )
+
+def make_todo(rng, i, today, stamp):
+    due = today + timedelta(days=rng.randrange(-60, 60))
+    return make_page(
+        f"todo-{i}",
+        stamp,
+        {
+            "名稱": {"type": "title", "title": rich(f"任務 {i}")},
+            "是否完成": {"type": "checkbox", "checkbox": rng.random() < 0.5},
+            "截止日": {"type": "date", "date": {"start": due.isoformat()}},
+        },
+    )
+
+def build_databases(books=1000, log_years=3, logs_per_day=2, todos=200, seed=42):
+    rng = random.Random(seed)
+    t0 = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    today = date.today()
+
+    book_pages = [make_book(rng, i, iso(t0 + timedelta(minutes=i))) for i in range(books)]
+
+    log_pages = []
+    first_day = today - timedelta(days=365 * log_years)
+    for n in range((today - first_day).days + 1):
+        day = first_day + timedelta(days=n)
+        for _ in range(rng.randrange(logs_per_day * 2 + 1)):
+            i = len(log_pages)
+            log_pages.append(make_log(rng, i, day, iso(t0 + timedelta(minutes=i)), books))
+
+    todo_pages = [make_todo(rng, i, today, iso(t0 + timedelta(minutes=i))) for i in range(todos)]
+
+    return {
+        BOOK_DB: Database(BOOK_SCHEMA, book_pages),
+        LOG_DB: Database(LOG_SCHEMA, log_pages),
+        TODO_DB: Database(TODO_SCHEMA, todo_pages),
+    }
+
+# =========================
+# 查詢（filter / sorts 只支援 gallery.py 會送出的形式）
+# =========================
+def plain_text(value):
+    return "".join(t.get("plain_text", "") for t in value or [])
+
+def match(page, f):
+    if not f:
+        return True
+    if "and" in f:
+        return all(match(page, x) for x in f["and"])
+    if "or" in f:
+        return any(match(page, x) for x in f["or"])
+    if "timestamp" in f:
+        cond = f[f["timestamp"]]
+        value = page[f["timestamp"]]
+        return compare(value, cond)
+    prop = page["properties"].get(f.get("property"), {})
+    if "date" in f:
+        start = (prop.get("date") or {}).get("start")
+        if start is None:
+            return bool(f["date"].get("is_empty"))
+        return compare(start[:10], {k: v[:10] for k, v in f["date"].items() if isinstance(v, str)})
+    if "checkbox" in f:
+        return prop.get("checkbox") == f["checkbox"]["equals"]
+    if "select" in f or "status" in f:
+        kind = "select" if "select" in f else "status"
+        return (prop.get(kind) or {}).get("name") == f[kind]["equals"]
+    if "multi_select" in f:
+        return f["multi_select"]["contains"] in [x["name"] for x in prop.get("multi_select") or []]
+    if "number" in f:
+        return compare(prop.get("number"), f["number"])
+    for kind in ("title", "rich_text"):
+        if kind in f:
+            return f[kind]["contains"].lower() in plain_text(prop.get(kind)).lower()
+    return True
+
+def compare(value, cond):
+    if value is None:
+        return bool(cond.get("is_empty"))
+    checks = {
+        "equals": lambda a, b: a == b,
+        "after": lambda a, b: a > b,
+        "on_or_after": lambda a, b: a >= b,
+        "before": lambda a, b: a < b,
+        "on_or_before": lambda a, b: a <= b,
+        "greater_than": lambda a, b: a > b,
+        "greater_than_or_equal_to": lambda a, b: a >= b,
+        "less_than": lambda a, b: a < b,
+        "less_than_or_equal_to": lambda a, b: a <= b,
+    }
+    return all(checks[k](value, v) for k, v in cond.items() if k in checks)
+
+def sort_key(s):
+    if "timestamp" in s:
+        return lambda p: p[s["timestamp"]]
+
+    def key(p):
+        prop = p["properties"].get(s["property"], {})
+        value = prop.get(prop.get("type"))
+        if isinstance(value, list):
+            return plain_text(value)
+        if isinstance(value, dict):
+            return value.get("name") or value.get("start") or ""
+        return value if value is not None else ""
+
+    return key
+
+class Database:
+    def __init__(self, schema, pages):
+        self.schema = schema
+        self.pages = {p["id"]: p for p in pages}
+        self.results = {}
+        self.lock = threading.Lock()
+
+    def query(self, body):
+        # 同一組 filter / sorts 換頁時不用重新篩選整個資料庫
+        key = json.dumps({"filter": body.get("filter"), "sorts": body.get("sorts")}, sort_keys=True)
+        with self.lock:
+            rows = self.results.get(key)
+            if rows is None:
+                rows = [p for p in self.pages.values() if not p["archived"] and match(p, body.get("filter"))]
+                for s in reversed(body.get("sorts") or []):
+                    rows.sort(key=sort_key(s), reverse=s.get("direction") == "descending")
+                self.results[key] = rows
+        size = min(int(body.get("page_size") or 100), 100)
+        start = int(body.get("start_cursor") or 0)
+        more = start + size < len(rows)
+        return {
+            "object": "list",
+            "results": rows[start : start + size],
+            "has_more": more,
+            "next_cursor": str(start + size) if more else None,
+        }
+
+    def write(self, page):
+        with self.lock:
+            self.pages[page["id"]] = page
+            self.results = {}
+
+def stored_properties(props, schema):
+    out = {}
+    for name, value in props.items():
+        kind = (schema.get(name) or {}).get("type") or next(iter(value))
+        value = value.get(kind)
+        if kind in ("title", "rich_text"):
+            value = rich(plain_text([{"plain_text": t["text"]["content"]} for t in value]))
+        out[name] = {"type": kind, kind: value}
+    return out
+
+# =========================
+# HTTP
+# =========================
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        # 標頭和內容分兩次寫出，不關 Nagle 每個回應會多等 40ms 的 delayed ACK
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, code, obj):
+        data = json.dumps(obj, ensure_ascii=False).encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _body(self):
+        n = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(n) or b"{}")
+
+    def _parts(self):
+        return self.path.split("?")[0].strip("/").split("/")
+
+    def _find(self, page_id):
+        for db in self.server.databases.values():
+            if page_id in db.pages:
+                return db
+        return None
+
+    def do_GET(self):
+        parts = self._parts()
+        self.server.count(f"GET /{parts[-2]}")
+        if parts[-2] == "databases" and parts[-1] in self.server.databases:
+            return self._send(200, {"object": "database", "id": parts[-1], "properties": self.server.databases[parts[-1]].schema})
+        if parts[-2] == "pages":
+            db = self._find(parts[-1])
+            if db:
+                return self._send(200, db.pages[parts[-1]])
+        return self._send(404, {"object": "error", "status": 404, "message": "not found"})
+
+    def do_POST(self):
+        body = self._body()
+        parts = self._parts()
+        if parts[-1] == "query" and parts[-2] in self.server.databases:
+            self.server.count("POST /query")
+            return self._send(200, self.server.databases[parts[-2]].query(body))
+        if parts[-1] == "pages":
+            self.server.count("POST /pages")
+            db = self.server.databases.get((body.get("parent") or {}).get("database_id"))
+            if db is None:
+                return self._send(400, {"object": "error", "status": 400, "message": "bad parent"})
+            page = make_page(str(uuid.uuid4()), iso(datetime.now(timezone.utc)), stored_properties(body.get("properties", {}), db.schema))
+            db.write(page)
+            return self._send(200, page)
+        return self._send(404, {"object": "error", "status": 404, "message": "not found"})
+
+    def do_PATCH(self):
+        body = self._body()
+        parts = self._parts()
+        self.server.count("PATCH /pages")
+        db = self._find(parts[-1])
+        if db is None:
+            return self._send(404, {"object": "error", "status": 404, "message": "not found"})
+        page = dict(db.pages[parts[-1]])
+        page["properties"] = {**page["properties"], **stored_properties(body.get("properties", {}), db.schema)}
+        page["last_edited_time"] = iso(datetime.now(timezone.utc))
+        if "archived" in body:
+            page["archived"] = bool(body["archived"])
+        db.write(page)
+        return self._send(200, page)
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, databases, port=0):
+        super().__init__(("127.0.0.1", port), Handler)
+        self.databases = databases
+        self.requests = {}
+        self.requests_lock = threading.Lock()
+
+    def count(self, name):
+        with self.requests_lock:
+            self.requests[name] = self.requests.get(name, 0) + 1
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.server_port}"
+
+def serve(databases, port=0):
+    server = StubServer(databases, port)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="本機假 Notion API")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--books", type=int, default=1000)
+    parser.add_argument("--log-years", type=int, default=3)
+    parser.add_argument("--todos", type=int, default=200)
+    args = parser.parse_args()
+    server = StubServer(build_databases(args.books, args.log_years, todos=args.todos), args.port)
+    print(f"NOTION_API_BASE={server.base_url}")
+    print(f"NOTION_DATABASE_ID={BOOK_DB} NOTION_LOG_ID={LOG_DB} NOTION_TODO_ID={TODO_DB}")
+    server.serve_forever()
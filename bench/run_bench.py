@@ -0,0 +1,266 @@
+# =========================
+# 離線效能測試：啟動本機假 Notion API，量測抓取 / 解析 / 篩選 / 彙總 / 頁面渲染
+#
+#   python bench/run_bench.py                    # small 規模，和 bench/baseline-small.json 比較
+#   python bench/run_bench.py --size medium      # 10k 本書、5 年紀錄
+#   python bench/run_bench.py --books 100000 --log-years 10
+#   python bench/run_bench.py --save             # 把這次結果存成新的 baseline
+#
+# 比 baseline 慢超過 --tolerance 倍（且差距超過 --slack-ms）的項目會列出來，並以 exit code 1 結束；
+# 比的是每項的最小值，排程和 GC 造成的雜訊大多只會拉高中位數
+# =========================
+import argparse
+import json
+import logging
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import warnings
+from datetime import date
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+import notion_stub
+
+SIZES = {
+    "small": {"books": 100, "log_years": 1, "logs_per_day": 2, "todos": 50},
+    "medium": {"books": 10_000, "log_years": 5, "logs_per_day": 2, "todos": 500},
+    "large": {"books": 100_000, "log_years": 10, "logs_per_day": 3, "todos": 2000},
+}
+PAGES = ["dashboard", "library", "calendar", "timer", "todo", "import"]
+SEARCH_QUERIES = ["時間", "城市 旅人", "Python", "作者1", "x"]
+
+def timed(fn, repeat):
+    runs = []
+    for _ in range(repeat):
+        t = time.perf_counter()
+        fn()
+        runs.append((time.perf_counter() - t) * 1000)
+    return {"min_ms": round(min(runs), 3), "median_ms": round(statistics.median(runs), 3), "runs": repeat}
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="gallery.py 離線效能測試")
+    parser.add_argument("--size", choices=SIZES, default="small")
+    parser.add_argument("--books", type=int)
+    parser.add_argument("--log-years", type=int)
+    parser.add_argument("--logs-per-day", type=int)
+    parser.add_argument("--todos", type=int)
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--baseline", help="預設 bench/baseline-<size>.json")
+    parser.add_argument("--save", action="store_true", help="把結果寫進 baseline")
+    parser.add_argument("--out", help="另外把結果寫到這個 JSON 檔")
+    parser.add_argument("--tolerance", type=float, default=1.5)
+    parser.add_argument("--slack-ms", type=float, default=5.0)
+    parser.add_argument("--skip-render", action="store_true")
+    parser.add_argument("--render-worker", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    config = dict(SIZES[args.size])
+    for key in config:
+        if getattr(args, key) is not None:
+            config[key] = getattr(args, key)
+    args.baseline = args.baseline or os.path.join(BENCH_DIR, f"baseline-{args.size}.json")
+    return args, config
+
+def start_stub(config, workdir):
+    server = notion_stub.serve(notion_stub.build_databases(**config))
+    os.environ.update(
+        NOTION_TOKEN="bench",
+        NOTION_API_BASE=server.base_url,
+        NOTION_DATABASE_ID=notion_stub.BOOK_DB,
+        NOTION_LOG_ID=notion_stub.LOG_DB,
+        NOTION_TODO_ID=notion_stub.TODO_DB,
+        NOTION_MIRROR_PATH=os.path.join(workdir, "mirror.sqlite3"),
+        ACCESS_PASSWORD="bench",
+    )
+    # 假伺服器不限速，量的是程式本身而不是 Notion 的每秒 3 次
+    os.environ.setdefault("NOTION_RATE_PER_SEC", "10000")
+    return server
+
+def quiet_streamlit():
+    # bare mode 下每個元件都會警告沒有 ScriptRunContext，壓測時關掉
+    import streamlit  # noqa: F401
+
+    for name in list(logging.root.manager.loggerDict):
+        if name.startswith("streamlit"):
+            logging.getLogger(name).disabled = True
+    logging.getLogger("reading_system").setLevel(logging.ERROR)
+    warnings.filterwarnings("ignore")
+
+def import_gallery(server):
+    quiet_streamlit()
+    sys.path.insert(0, REPO_DIR)
+    import gallery
+
+    # gallery.py 會讀 .env（override=True）；確定真的是連到假伺服器才往下跑
+    if gallery.NOTION_API_BASE != server.base_url or gallery.BOOK_DS_ID != notion_stub.BOOK_DB:
+        sys.exit("gallery.py 沒有連到假伺服器（.env 覆蓋了 NOTION_API_BASE 或資料庫 ID？），中止")
+    return gallery
+
+def bench_data(g, repeat, workdir):
+    results = {}
+
+    def fresh(name):
+        return g.DeltaSync(name, mirror=None, **g.SYNC_DATASETS[name])
+
+    stores = {}
+    for name in ("books", "logs", "todos"):
+        stores[name] = fresh(name)
+        results[f"fetch.{name}_full_sync"] = timed(lambda: stores[name].sync(full=True), repeat)
+    results["fetch.books_delta_sync"] = timed(lambda: stores["books"].sync(), repeat)
+    books, logs = stores["books"], stores["logs"]
+
+    mirror = g.Mirror(os.path.join(workdir, "bench-mirror.sqlite3"))
+    results["mirror.books_save"] = timed(
+        lambda: mirror.save("books", g.BOOK_DS_ID, books.rows, books.created, set(), books.high_water, time.time(), replace=True),
+        repeat,
+    )
+    results["mirror.books_load"] = timed(lambda: mirror.load("books", g.BOOK_DS_ID, g.Book.from_dict), repeat)
+
+    book_batches = list(g.iter_query_pages(g.BOOK_DS_ID))
+    log_batches = list(g.iter_query_pages(g.LOG_DS_ID))
+    book_types = g.fetch_property_types(g.BOOK_DS_ID)
+    log_types = g.fetch_property_types(g.LOG_DS_ID)
+    results["parse.books"] = timed(lambda: [g.parse_books(b, book_types) for b in book_batches], repeat)
+    results["parse.logs"] = timed(lambda: [g.parse_logs(b, log_types) for b in log_batches], repeat)
+
+    results["filter.search_build"] = timed(lambda: g.SearchIndex().sync_from(books), repeat)
+    search = g.SearchIndex()
+    search.sync_from(books)
+
+    def run_queries():
+        search.cache = {}
+        for q in SEARCH_QUERIES:
+            search.search(q)
+
+    results["filter.search_queries"] = timed(run_queries, repeat)
+    results["filter.facet_build"] = timed(lambda: g.FacetIndex().sync_from(books), repeat)
+    facets = g.FacetIndex().sync_from(books)
+    selected = {"status": "已讀", "category": "文學", "genre": None, "tags": "推薦"}
+
+    def facet_counts():
+        m = facets.mask(selected)
+        for f in g.FACET_FIELDS:
+            facets.counts(f, selected)
+        facets.select(m)
+
+    results["filter.facet_mask_counts"] = timed(facet_counts, repeat)
+
+    results["aggregate.rollup_build"] = timed(lambda: g.ReadingRollup().sync_from(logs), repeat)
+    rollup = g.ReadingRollup().sync_from(logs)
+    today = date.today()
+    results["aggregate.rollup_windows"] = timed(lambda: (rollup.days(today, 7), rollup.months(today, 6)), repeat)
+
+    def heatmap():
+        rollup.frame_key = None
+        rollup.heatmap(today.year - g.HEATMAP_YEARS + 1, today.year)
+
+    results["aggregate.heatmap"] = timed(heatmap, repeat)
+    results["aggregate.book_frame"] = timed(lambda: g.BookFrame().sync_from(books), repeat)
+    results["aggregate.calendar_month"] = timed(lambda: g.query_month(today.year, today.month), repeat)
+
+    book_id = next(iter(books.rows))
+
+    def write_log():
+        ok, page = g.create_page(g.LOG_DS_ID, g.log_props(today, book_id, 10, 20))
+        logs.apply(page)
+
+    results["write.log_create_apply"] = timed(write_log, repeat)
+    return results
+
+def bench_render(repeat):
+    # AppTest 和 bare mode import 的 gallery 放在同一個 process 會互相干擾，渲染改在子程序量
+    with tempfile.NamedTemporaryFile(suffix=".json", delete=False) as f:
+        out = f.name
+    subprocess.run([sys.executable, os.path.abspath(__file__), "--render-worker", out, "--repeat", str(repeat)], check=True)
+    with open(out, encoding="utf-8") as f:
+        return json.load(f)
+
+def render_worker(out, repeat):
+    from streamlit.testing.v1 import AppTest
+
+    quiet_streamlit()
+
+    results = {}
+    for page in PAGES:
+        at = AppTest.from_file(os.path.join(REPO_DIR, "gallery.py"), default_timeout=300)
+        at.session_state["password_correct"] = True
+        at.session_state["last_activity"] = time.time()
+        at.session_state["page"] = page
+        t = time.perf_counter()
+        at.run()
+        first = (time.perf_counter() - t) * 1000
+        if at.exception:
+            print(f"  ! {page}: {at.exception[0].value}")
+        results[f"render.{page}"] = timed(at.run, repeat)
+        results[f"render.{page}"]["first_ms"] = round(first, 3)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(results, f)
+
+def compare(results, baseline, tolerance, slack_ms):
+    regressions = []
+    print(f"\n{'項目':<32}{'最小值 ms':>12}{'baseline':>12}{'比例':>8}")
+    for key, r in results.items():
+        base = baseline.get(key)
+        if not base:
+            print(f"{key:<32}{r['min_ms']:>12.2f}{'-':>12}{'-':>8}")
+            continue
+        ratio = r["min_ms"] / base["min_ms"] if base["min_ms"] else 1.0
+        flag = ""
+        if ratio > tolerance and r["min_ms"] - base["min_ms"] > slack_ms:
+            regressions.append(key)
+            flag = "  ← 變慢"
+        print(f"{key:<32}{r['min_ms']:>12.2f}{base['min_ms']:>12.2f}{ratio:>8.2f}{flag}")
+    return regressions
+
+def main():
+    args, config = parse_args()
+    if args.render_worker:
+        return render_worker(args.render_worker, args.repeat)
+    workdir = tempfile.mkdtemp(prefix="gallery-bench-")
+    print(f"規模: {config}")
+    t = time.perf_counter()
+    server = start_stub(config, workdir)
+    print(f"假資料建立完成 ({time.perf_counter() - t:.1f}s)")
+    g = import_gallery(server)
+
+    results = bench_data(g, args.repeat, workdir)
+    if not args.skip_render:
+        results.update(bench_render(args.repeat))
+
+    report = {
+        "config": config,
+        "environment": {"python": platform.python_version(), "platform": platform.platform()},
+        "requests": server.requests,
+        "results": results,
+    }
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+    regressions = []
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline.get("config") != config:
+            print(f"\nbaseline 的規模 {baseline.get('config')} 與這次不同，略過比較")
+        else:
+            regressions = compare(results, baseline["results"], args.tolerance, args.slack_ms)
+    else:
+        print(json.dumps(results, ensure_ascii=False, indent=2))
+
+    if args.save:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\n已寫入 {args.baseline}")
+    if regressions:
+        print(f"\n{len(regressions)} 項比 baseline 慢: {', '.join(regressions)}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,29 @@
 import os
+import io
+import html
+import re
+import csv
 import time
+import json
+import logging
+import glob
+import hashlib
+import random
+import sqlite3
+import sys
+import threading
+import unicodedata
+from collections import OrderedDict, deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from dataclasses import dataclass
 from datetime import datetime, date, timedelta
+from urllib.parse import urlsplit
 import requests
+from requests.adapters import HTTPAdapter
 import calendar
-import pandas as pd
-import altair as alt
 from dotenv import load_dotenv
+from PIL import Image
 import streamlit as st
 from zoneinfo import ZoneInfo
 
@@ -13,6 +31,7 @@ from zoneinfo import ZoneInfo
 # ✅ 必須最先呼叫 set_page_config
 # =========================
 st.set_page_config(page_title="閱讀管理系統", layout="wide", page_icon="📚")
+rerun_started = time.perf_counter()
 
 # =========================
 # 0) 基本設定
@@ -52,7 +71,9 @@ def check_password():
         password_list = [p.strip() for p in raw_passwords.split(",") if p.strip()]
 
         if pw in password_list:
+            admin_list = [p.strip() for p in os.getenv("ADMIN_PASSWORD", "").split(",") if p.strip()]
             st.session_state["password_correct"] = True
+            st.session_state["is_admin"] = not admin_list or pw in admin_list
             st.session_state["last_activity"] = time.time()
             st.success("✅ 登入成功")
             st.rerun()
@@ -70,6 +91,375 @@ DEMO_MODE = False
 if not NOTION_TOKEN or not BOOK_DS_ID:
     DEMO_MODE = True
 
+# =========================
+# 0.2) Notion API 共用連線（連線池、限速、429 退避重試）
+# =========================
+NOTION_API_BASE = os.getenv("NOTION_API_BASE", "https://api.notion.com/v1").rstrip("/")
+NOTION_VERSION = "2022-06-28"
+NOTION_RATE_PER_SEC = float(os.getenv("NOTION_RATE_PER_SEC", "3"))  # 官方限制約每秒 3 次；壓測本機假伺服器時可調高
+NOTION_MAX_RETRIES = 4
+NOTION_TIMEOUT = (5, 30)  # (連線, 讀取) 秒
+NOTION_RETRY_STATUS = {429, 500, 502, 503, 504}
+
+class TokenBucket:
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        with self.lock:
+            while True:
+                now = time.monotonic()
+                if now < self.blocked_until:
+                    time.sleep(self.blocked_until - now)
+                    continue
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                time.sleep((1 - self.tokens) / self.rate)
+
+    def hold(self, seconds):
+        # 收到 429 時讓所有執行緒一起暫停，而不是各自繼續撞限速
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+class NotionClient:
+    def __init__(self, token):
+        self.session = requests.Session()
+        self.session.headers.update(
+            {
+                "Authorization": f"Bearer {token}",
+                "Notion-Version": NOTION_VERSION,
+                "Content-Type": "application/json",
+            }
+        )
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.bucket = TokenBucket(NOTION_RATE_PER_SEC, NOTION_RATE_PER_SEC)
+
+    def _retry_delay(self, attempt, response=None):
+        retry_after = response.headers.get("Retry-After") if response is not None else None
+        if retry_after:
+            try:
+                return float(retry_after) + random.uniform(0, 0.5)
+            except ValueError:
+                pass
+        return random.uniform(0, min(8.0, 0.5 * 2**attempt))
+
+    def request(self, method, path, json=None, params=None, timeout=NOTION_TIMEOUT):
+        # 建立頁面的 POST 若已送達伺服器再重送會重複新增，只對讀取類請求重試逾時
+        idempotent = method != "POST" or path.endswith("/query")
+        url = f"{NOTION_API_BASE}{path}"
+        endpoint = notion_endpoint(method, path)
+        metrics = get_metrics()
+        for attempt in range(NOTION_MAX_RETRIES + 1):
+            self.bucket.acquire()
+            started = time.perf_counter()
+            try:
+                response = self.session.request(method, url, json=json, params=params, timeout=timeout)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                metrics.incr("notion_errors_total", endpoint=endpoint, error=type(e).__name__)
+                retryable = idempotent or isinstance(e, requests.ConnectTimeout)
+                if not retryable or attempt == NOTION_MAX_RETRIES:
+                    raise
+                time.sleep(self._retry_delay(attempt))
+                continue
+            metrics.observe("notion_request_seconds", time.perf_counter() - started, endpoint=endpoint)
+            metrics.incr("notion_responses_total", endpoint=endpoint, status=str(response.status_code))
+            status = response.status_code
+            # 502/504 可能是頁面已經建好才出錯；非冪等請求只重試確定沒處理的 429 和帶 Retry-After 的 503
+            retryable = idempotent or status == 429 or (status == 503 and "Retry-After" in response.headers)
+            if status in NOTION_RETRY_STATUS and retryable and attempt < NOTION_MAX_RETRIES:
+                delay = self._retry_delay(attempt, response)
+                if response.status_code == 429:
+                    self.bucket.hold(delay)
+                time.sleep(delay)
+                continue
+            return response
+
+    def get(self, path, **kwargs):
+        return self.request("GET", path, **kwargs)
+
+    def post(self, path, json=None, **kwargs):
+        return self.request("POST", path, json=json, **kwargs)
+
+    def patch(self, path, json=None, **kwargs):
+        return self.request("PATCH", path, json=json, **kwargs)
+
+@st.cache_resource(show_spinner=False)
+def get_notion_client():
+    return NotionClient(NOTION_TOKEN)
+
+def notion_endpoint(method, path):
+    parts = path.strip("/").split("/")
+    if parts[-1] == "query":
+        return "query"
+    if parts[0] == "databases":
+        return "database"
+    if method == "POST":
+        return "create"
+    return "update" if method == "PATCH" else "page"
+
+# =========================
+# 0.3) 效能量測（Notion 請求、快取命中、頁面渲染；保留最近的樣本算百分位數）
+# =========================
+METRICS_WINDOW = 500
+METRICS_LOG_SECONDS = 300
+METRICS_PREFIX = "reading"
+
+class Metrics:
+    def __init__(self, window=METRICS_WINDOW):
+        self.window = window
+        self.samples = {}
+        self.totals = {}
+        self.counters = {}
+        self.gauges = {}
+        self.logged_at = time.time()
+        self.lock = threading.Lock()
+        # 每條執行緒自己的次數：同時有好幾個 session 在 rerun，全域計數相減會算到別人的請求
+        self.local = threading.local()
+
+    def observe(self, name, seconds, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            if key not in self.samples:
+                self.samples[key] = deque(maxlen=self.window)
+                self.totals[key] = [0, 0.0]
+            self.samples[key].append(seconds)
+            self.totals[key][0] += 1
+            self.totals[key][1] += seconds
+        counts = self.local.__dict__.setdefault("counts", {})
+        counts[name] = counts.get(name, 0) + 1
+
+    def incr(self, name, n=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + n
+
+    def gauge(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.gauges[key] = value
+
+    @contextmanager
+    def timer(self, name, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    def count(self, name):
+        with self.lock:
+            return sum(total[0] for (n, _), total in self.totals.items() if n == name)
+
+    def thread_count(self, name):
+        return getattr(self.local, "counts", {}).get(name, 0)
+
+    def timers(self):
+        with self.lock:
+            items = [(key, sorted(samples), tuple(self.totals[key])) for key, samples in self.samples.items()]
+        out = []
+        for (name, labels), ordered, (count, total) in sorted(items):
+            pct = {q: ordered[min(len(ordered) - 1, int(q * len(ordered)))] for q in (0.5, 0.95, 0.99)}
+            out.append({"name": name, "labels": dict(labels), "count": count, "sum": total, "quantiles": pct})
+        return out
+
+    def counter_items(self):
+        with self.lock:
+            return [{"name": name, "labels": dict(labels), "value": v} for (name, labels), v in sorted(self.counters.items())]
+
+    def gauge_items(self):
+        with self.lock:
+            return [{"name": name, "labels": dict(labels), "value": v} for (name, labels), v in sorted(self.gauges.items())]
+
+    def hit_rates(self):
+        caches = {}
+        for c in self.counter_items():
+            if c["name"] == "cache_requests_total":
+                stats = caches.setdefault(c["labels"]["cache"], {"hit": 0, "stale": 0, "miss": 0})
+                stats[c["labels"]["result"]] += c["value"]
+        return {name: (s["hit"] + s["stale"]) / max(sum(s.values()), 1) for name, s in caches.items()}
+
+    def prometheus(self):
+        def fmt(labels):
+            return "{" + ",".join(f'{k}="{v}"' for k, v in labels.items()) + "}" if labels else ""
+
+        lines, typed = [], set()
+        for t in self.timers():
+            metric = f"{METRICS_PREFIX}_{t['name']}"
+            if metric not in typed:
+                lines.append(f"# TYPE {metric} summary")
+                typed.add(metric)
+            for q, v in t["quantiles"].items():
+                lines.append(f"{metric}{fmt({**t['labels'], 'quantile': q})} {v:.6f}")
+            lines.append(f"{metric}_sum{fmt(t['labels'])} {t['sum']:.6f}")
+            lines.append(f"{metric}_count{fmt(t['labels'])} {t['count']}")
+        for c in self.counter_items():
+            metric = f"{METRICS_PREFIX}_{c['name']}"
+            if metric not in typed:
+                lines.append(f"# TYPE {metric} counter")
+                typed.add(metric)
+            lines.append(f"{metric}{fmt(c['labels'])} {c['value']}")
+        for g in self.gauge_items():
+            metric = f"{METRICS_PREFIX}_{g['name']}"
+            if metric not in typed:
+                lines.append(f"# TYPE {metric} gauge")
+                typed.add(metric)
+            lines.append(f"{metric}{fmt(g['labels'])} {g['value']}")
+        return "\n".join(lines) + "\n"
+
+    def summary(self):
+        parts = []
+        for t in self.timers():
+            label = ",".join(f"{v}" for v in t["labels"].values())
+            if t["name"].endswith("_seconds"):
+                p50, p95 = (f"{t['quantiles'][q] * 1000:.0f}ms" for q in (0.5, 0.95))
+            else:
+                p50, p95 = (f"{t['quantiles'][q]:g}" for q in (0.5, 0.95))
+            parts.append(f"{t['name']}[{label}] n={t['count']} p50={p50} p95={p95}")
+        parts.extend(f"cache[{name}]={rate:.0%}" for name, rate in self.hit_rates().items())
+        return "; ".join(parts)
+
+    def finish_rerun(self, started, notion_calls_before, page):
+        self.observe("rerun_seconds", time.perf_counter() - started, page=page)
+        self.observe("rerun_notion_calls", self.thread_count("notion_request_seconds") - notion_calls_before, page=page)
+        now = time.time()
+        if now - self.logged_at > METRICS_LOG_SECONDS:
+            self.logged_at = now
+            logger.info("metrics: %s", self.summary())
+
+@st.cache_resource(show_spinner=False)
+def get_metrics():
+    return Metrics()
+
+rerun_notion_calls = get_metrics().thread_count("notion_request_seconds")
+
+# =========================
+# 0.4) 查詢結果快取（整個 process 共用一個位元組上限，LRU 淘汰；key 帶資料版本，版本一變舊的自然失效）
+# =========================
+RESULT_CACHE_MB = float(os.getenv("RESULT_CACHE_MB", "64"))
+SIZE_SAMPLE = 32  # 長串列只抽樣這麼多筆估大小
+
+def estimate_size(value, seen=None):
+    # sys.getsizeof 只算外殼，這裡往下走容器和 __slots__；長串列抽樣後按比例放大
+    seen = set() if seen is None else seen
+    if id(value) in seen:
+        return 0
+    seen.add(id(value))
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        items = list(value.items())
+        sample = items if len(items) <= SIZE_SAMPLE else items[:: len(items) // SIZE_SAMPLE]
+        inner = sum(estimate_size(k, seen) + estimate_size(v, seen) for k, v in sample)
+        return size + inner * len(items) // max(len(sample), 1)
+    if isinstance(value, (list, tuple, set, frozenset)):
+        items = list(value)
+        sample = items if len(items) <= SIZE_SAMPLE else items[:: len(items) // SIZE_SAMPLE]
+        inner = sum(estimate_size(v, seen) for v in sample)
+        return size + inner * len(items) // max(len(sample), 1)
+    slots = getattr(type(value), "__slots__", None)
+    if slots:
+        return size + sum(estimate_size(getattr(value, s, None), seen) for s in slots)
+    return size
+
+class ResultCache:
+    def __init__(self, budget_bytes):
+        self.budget = budget_bytes
+        self.entries = OrderedDict()  # (namespace, key) -> (version, value, size)
+        self.bytes = 0
+        self.usage = {}  # namespace -> [筆數, bytes]
+        self.evictions = {}
+        self.lock = threading.Lock()
+
+    def _drop(self, full_key):
+        _, _, size = self.entries.pop(full_key)
+        self.bytes -= size
+        usage = self.usage[full_key[0]]
+        usage[0] -= 1
+        usage[1] -= size
+
+    def _publish(self, namespace):
+        metrics = get_metrics()
+        metrics.gauge("result_cache_used_bytes", self.bytes)
+        metrics.gauge("result_cache_budget_bytes", self.budget)
+        metrics.gauge("result_cache_bytes", self.usage[namespace][1], cache=namespace)
+        metrics.gauge("result_cache_entries", self.usage[namespace][0], cache=namespace)
+
+    def get(self, namespace, key, version=None):
+        # 沒有或版本不符都回傳 None；版本舊的順手丟掉
+        full_key = (namespace, key)
+        with self.lock:
+            entry = self.entries.get(full_key)
+            if entry is None:
+                return None
+            if entry[0] != version:
+                self._drop(full_key)
+                self._publish(namespace)
+                return None
+            self.entries.move_to_end(full_key)
+            return entry[1]
+
+    def contains(self, namespace, key, version=None):
+        entry = self.entries.get((namespace, key))
+        return entry is not None and entry[0] == version
+
+    def put(self, namespace, key, value, version=None):
+        size = estimate_size(value)
+        full_key = (namespace, key)
+        evicted = []
+        with self.lock:
+            if full_key in self.entries:
+                self._drop(full_key)
+            if size <= self.budget:
+                self.entries[full_key] = (version, value, size)
+                self.bytes += size
+                usage = self.usage.setdefault(namespace, [0, 0])
+                usage[0] += 1
+                usage[1] += size
+            while self.bytes > self.budget:
+                old_key = next(iter(self.entries))
+                self._drop(old_key)
+                self.evictions[old_key[0]] = self.evictions.get(old_key[0], 0) + 1
+                evicted.append(old_key[0])
+            self.usage.setdefault(namespace, [0, 0])
+            for name in {namespace, *evicted}:
+                self._publish(name)
+        for name in evicted:
+            get_metrics().incr("result_cache_evictions_total", cache=name)
+        return value
+
+    def items(self, namespace):
+        with self.lock:
+            return [(k, entry[1]) for (ns, k), entry in self.entries.items() if ns == namespace]
+
+    def clear(self, namespace):
+        with self.lock:
+            for full_key in [k for k in self.entries if k[0] == namespace]:
+                self._drop(full_key)
+            if namespace in self.usage:
+                self._publish(namespace)
+
+    def stats(self):
+        with self.lock:
+            return {
+                "bytes": self.bytes,
+                "budget": self.budget,
+                "entries": len(self.entries),
+                "evictions": sum(self.evictions.values()),
+                "namespaces": {ns: {"entries": u[0], "bytes": u[1], "evictions": self.evictions.get(ns, 0)} for ns, u in self.usage.items()},
+            }
+
+@st.cache_resource(show_spinner=False)
+def get_result_cache():
+    return ResultCache(int(RESULT_CACHE_MB * 1024 * 1024))
+
 # =========================
 # 1) 資料處理
 # =========================
@@ -98,195 +488,582 @@ TODO_NAME = "名稱"
 TODO_DONE = "是否完成"
 TODO_DUE = "截止日"
 
-def get_plain_text(props, key):
-    try:
-        p = props.get(key, {})
-        if "title" in p:
-            return "".join([t.get("plain_text", "") for t in p["title"]])
-        if "rich_text" in p:
-            return "".join([t.get("plain_text", "") for t in p["rich_text"]])
-        if "url" in p:
-            return p["url"] or ""
-        if "number" in p:
-            return str(p["number"]) if p["number"] is not None else ""
-        return ""
-    except:
-        return ""
-
-def get_number(props, key):
-    try:
-        return props.get(key, {}).get("number", 0)
-    except:
-        return 0
-
-def get_checkbox(props, key):
+# =========================
+# 1.0) 精簡書籍紀錄（__slots__、數字/日期轉型、分類字串 intern）
+# =========================
+def to_int(value):
+    if value in (None, ""):
+        return None
     try:
-        return props.get(key, {}).get("checkbox", False)
-    except:
-        return False
-
-def get_select(props, key):
+        return int(float(value))
+    except (TypeError, ValueError):
+        # 文字欄位像「2001年」、「320 頁」也取出數字
+        m = re.search(r"\d+", str(value))
+        return int(m.group()) if m else None
+
+def to_date(value):
+    if not value:
+        return None
+    if isinstance(value, date):
+        return value
     try:
-        return props.get(key, {}).get("select", {}).get("name")
-    except:
+        return date.fromisoformat(str(value)[:10])
+    except ValueError:
         return None
 
-def get_multi_select(props, key):
-    try:
-        return [x["name"] for x in props.get(key, {}).get("multi_select", [])]
-    except:
-        return []
+def intern_str(value):
+    return sys.intern(value) if isinstance(value, str) else value
+
+class Book:
+    __slots__ = ("id", "title", "author", "status", "category", "genre", "tags", "cover", "publisher", "year", "isbn", "pages", "summary", "start_date", "end_date", "pdf")
+
+    @classmethod
+    def from_dict(cls, d):
+        b = cls.__new__(cls)
+        for f in cls.__slots__:
+            setattr(b, f, d.get(f))
+        # 狀態/分類/標籤在幾千本書之間重複，intern 之後每個值只存一份
+        b.status = intern_str(b.status)
+        b.category = intern_str(b.category)
+        b.genre = intern_str(b.genre)
+        b.tags = tuple(intern_str(t) for t in b.tags or ())
+        b.year = to_int(b.year)
+        b.pages = to_int(b.pages)
+        b.start_date = to_date(b.start_date)
+        b.end_date = to_date(b.end_date)
+        return b
+
+    # 保留 dict 風格的存取，頁面程式不必改寫
+    def __getitem__(self, key):
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key) from None
+
+    def get(self, key, default=None):
+        return getattr(self, key, default)
+
+    def to_dict(self):
+        return {f: getattr(self, f) for f in self.__slots__}
+
+    def __repr__(self):
+        return f"Book({self.id!r}, {self.title!r})"
 
-def get_date(props, key):
-    try:
-        return props.get(key, {}).get("date", {}).get("start")
-    except:
-        return None
+# =========================
+# 1.0.1) 批次解析（依資料庫 schema 的欄位型別，一次把整頁結果轉成欄位）
+# =========================
+logger = logging.getLogger("reading_system")
+if not logger.handlers:
+    # 自己的 logger 沒接 handler 的話 info 會被丟掉（定期的 metrics 摘要就看不到）
+    _handler = logging.StreamHandler()
+    _handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+    logger.addHandler(_handler)
+    if logger.level == logging.NOTSET:
+        logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+def _rich_text(items):
+    return "".join(t.get("plain_text", "") for t in items)
+
+def _first_file_url(files):
+    if not files:
+        return ""
+    f = files[0]
+    return (f.get("file") or {}).get("url") or (f.get("external") or {}).get("url") or ""
+
+PROPERTY_EXTRACTORS = {
+    "title": lambda p: _rich_text(p["title"]),
+    "rich_text": lambda p: _rich_text(p["rich_text"]),
+    "url": lambda p: p["url"],
+    "number": lambda p: p["number"],
+    "select": lambda p: (p["select"] or {}).get("name"),
+    "status": lambda p: (p["status"] or {}).get("name"),
+    "multi_select": lambda p: [x["name"] for x in p["multi_select"]],
+    "date": lambda p: (p["date"] or {}).get("start"),
+    "checkbox": lambda p: p["checkbox"],
+    "files": lambda p: _first_file_url(p["files"]),
+    "relation": lambda p: [x["id"] for x in p["relation"]],
+}
 
-def get_url_prop(props, key):
-    try:
-        return props.get(key, {}).get("url")
-    except:
-        return None
+BOOK_PROPS = {
+    "title": PROP_TITLE,
+    "author": PROP_AUTHOR,
+    "status": PROP_STATUS,
+    "category": PROP_CATEGORY,
+    "genre": PROP_GENRE,
+    "tags": PROP_TAGS,
+    "cover": PROP_COVER,
+    "publisher": PROP_PUBLISHER,
+    "year": PROP_YEAR,
+    "isbn": PROP_ISBN,
+    "pages": PROP_PAGES,
+    "summary": PROP_SUMMARY,
+    "start_date": PROP_START_DATE,
+    "end_date": PROP_END_DATE,
+    "pdf": PROP_PDF,
+}
+LOG_PROPS = {"date": LOG_DATE, "pages": LOG_PAGES, "mins": LOG_MINS}
+TODO_PROPS = {"name": TODO_NAME, "done": TODO_DONE, "due_date": TODO_DUE}
+
+class ParseReport:
+    def __init__(self, dataset):
+        self.dataset = dataset
+        self.rows = 0
+        self.errors = {}
+        self.samples = []
+
+    def error(self, prop, page_id, exc):
+        self.errors[prop] = self.errors.get(prop, 0) + 1
+        if len(self.samples) < 5:
+            self.samples.append(f"{page_id} {prop}: {type(exc).__name__}: {exc}")
+
+    @property
+    def error_count(self):
+        return sum(self.errors.values())
+
+    def log(self):
+        if self.errors:
+            logger.warning(
+                "%s: 解析 %d 筆，%d 個欄位錯誤 %s；例如 %s",
+                self.dataset, self.rows, self.error_count, self.errors, self.samples,
+            )
+        else:
+            # 每次同步、每個月份查詢都會走到這裡，沒有錯誤就不必出現在預設的 log 裡
+            logger.debug("%s: 解析 %d 筆，無錯誤", self.dataset, self.rows)
+
+def _extract_value(kind, value):
+    return PROPERTY_EXTRACTORS[kind or value["type"]](value)
 
-def get_cover(page_obj):
+def extract_column(results, props_list, prop, kind, report):
+    # 快速路徑：整欄一個 list comprehension；真的遇到壞資料才逐筆重跑並記錄
+    extractor = PROPERTY_EXTRACTORS.get(kind)
     try:
-        cover = page_obj.get("cover")
-        if not cover:
-            props = page_obj.get("properties", {})
-            p = props.get(PROP_COVER, {})
-            if "url" in p and p["url"]:
-                return p["url"]
-            if "files" in p and p["files"]:
-                f = p["files"][0]
-                return f.get("file", {}).get("url") or f.get("external", {}).get("url")
-            return ""
-        if cover["type"] == "external":
-            return cover["external"]["url"]
-        if cover["type"] == "file":
-            return cover["file"]["url"]
-        return ""
-    except:
+        if extractor:
+            return [extractor(p[prop]) if prop in p else None for p in props_list]
+        return [_extract_value(None, p[prop]) if prop in p else None for p in props_list]
+    except Exception:
+        column = []
+        for page, p in zip(results, props_list):
+            value = p.get(prop)
+            try:
+                try:
+                    column.append(_extract_value(kind if extractor else None, value) if value else None)
+                except Exception:
+                    # schema 剛改過型別時，舊頁面的值還是原本的型別
+                    if not extractor or value.get("type") in (None, kind):
+                        raise
+                    column.append(_extract_value(None, value))
+            except Exception as e:
+                report.error(prop, page.get("id"), e)
+                column.append(None)
+        return column
+
+def parse_columns(results, fields, prop_types=None, report=None):
+    report = report or ParseReport("?")
+    prop_types = prop_types or {}
+    props_list = [page.get("properties") or {} for page in results]
+    report.rows += len(results)
+    return {out: extract_column(results, props_list, prop, prop_types.get(prop), report) for out, prop in fields.items()}
+
+def as_text(value):
+    if value is None:
         return ""
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+def page_cover(page, fallback):
+    cover = page.get("cover")
+    if cover:
+        return (cover.get(cover.get("type")) or {}).get("url") or ""
+    return fallback or ""
+
+def parse_books(results, prop_types=None, report=None):
+    cols = parse_columns(results, BOOK_PROPS, prop_types, report)
+    return [
+        Book.from_dict(
+            {
+                "id": page["id"],
+                "title": as_text(title) or "(無書名)",
+                "author": as_text(author),
+                "status": status or "未分類",
+                "category": category or "未分類",
+                "genre": genre or "未分類",
+                "tags": tags or (),
+                "cover": page_cover(page, cover),
+                "publisher": as_text(publisher),
+                "year": year,
+                "isbn": as_text(isbn),
+                "pages": pages,
+                "summary": as_text(summary),
+                "start_date": start_date,
+                "end_date": end_date,
+                "pdf": pdf,
+            }
+        )
+        for page, title, author, status, category, genre, tags, cover, publisher, year, isbn, pages, summary, start_date, end_date, pdf in zip(
+            results, *cols.values()
+        )
+    ]
+
+def parse_logs(results, prop_types=None, report=None):
+    cols = parse_columns(results, LOG_PROPS, prop_types, report)
+    return [
+        {"id": page["id"], "date": d, "pages": pages or 0, "mins": mins or 0} if d else None
+        for page, d, pages, mins in zip(results, cols["date"], cols["pages"], cols["mins"])
+    ]
+
+def parse_todos(results, prop_types=None, report=None):
+    cols = parse_columns(results, TODO_PROPS, prop_types, report)
+    return [
+        {"id": page["id"], "name": as_text(name), "done": bool(done), "due_date": due}
+        for page, name, done, due in zip(results, cols["name"], cols["done"], cols["due_date"])
+    ]
 
-def parse_book(p):
-    props = p.get("properties", {})
-    return {
-        "id": p["id"],
-        "title": get_plain_text(props, PROP_TITLE) or "(無書名)",
-        "author": get_plain_text(props, PROP_AUTHOR),
-        "status": get_select(props, PROP_STATUS) or "未分類",
-        "category": get_select(props, PROP_CATEGORY) or "未分類",
-        "genre": get_select(props, PROP_GENRE) or "未分類",
-        "tags": get_multi_select(props, PROP_TAGS),
-        "cover": get_cover(p),
-        "publisher": get_plain_text(props, PROP_PUBLISHER),
-        "year": get_plain_text(props, PROP_YEAR),
-        "isbn": get_plain_text(props, PROP_ISBN),
-        "pages": get_plain_text(props, PROP_PAGES),
-        "summary": get_plain_text(props, PROP_SUMMARY),
-        "start_date": get_date(props, PROP_START_DATE),
-        "end_date": get_date(props, PROP_END_DATE),
-        "pdf": get_url_prop(props, PROP_PDF),
-    }
+# =========================
+# 1.1) 分頁查詢（跟隨 next_cursor，逐頁 yield，不一次持有整包 JSON）
+# =========================
+NOTION_PAGE_SIZE = 100
 
-@st.cache_data(show_spinner=False, ttl=60)
-def fetch_books():
-    if DEMO_MODE:
-        return []
-    url = f"https://api.notion.com/v1/databases/{BOOK_DS_ID}/query"
-    headers = {
-        "Authorization": f"Bearer {NOTION_TOKEN}",
-        "Notion-Version": "2022-06-28",
-        "Content-Type": "application/json",
-    }
-    try:
-        response = requests.post(url, headers=headers, json={"page_size": 100})
-        if response.status_code == 200:
-            return [parse_book(p) for p in response.json().get("results", [])]
+class NotionError(Exception):
+    pass
+
+def iter_query_pages(ds_id, body=None, params=None):
+    client = get_notion_client()
+    payload = dict(body or {})
+    payload["page_size"] = NOTION_PAGE_SIZE
+    while True:
+        response = client.post(f"/databases/{ds_id}/query", json=payload, params=params)
+        if response.status_code != 200:
+            raise NotionError(f"連線錯誤: {response.text}")
+        data = response.json()
+        yield data.get("results", [])
+        next_cursor = data.get("next_cursor")
+        if not data.get("has_more") or not next_cursor:
+            return
+        payload["start_cursor"] = next_cursor
+
+def iter_parsed(name, ds_id, parser, body=None):
+    report = ParseReport(name)
+    types = fetch_property_types(ds_id)
+    for results in iter_query_pages(ds_id, body):
+        for row in parser(results, types, report):
+            if row is not None:
+                yield row
+    report.log()
+
+def fetch_page(page_id):
+    response = get_notion_client().get(f"/pages/{page_id}")
+    if response.status_code == 404:
+        return {"id": page_id, "archived": True}
+    if response.status_code != 200:
+        raise NotionError(f"連線錯誤: {response.text}")
+    return response.json()
+
+# =========================
+# 1.2) 增量同步（只抓 last_edited_time 高水位之後有變動的頁面）
+# =========================
+FULL_RESYNC_SECONDS = 30 * 60  # 定期全量同步一次，順便修正任何漏掉的變動
+# 查詢不會回傳封存 / 丟進垃圾桶的頁面，增量同步看不到它們被刪；隔一段時間只掃一次 ID 對帳
+RECONCILE_SECONDS = 5 * 60
+
+def same_row(a, b):
+    if a is None or b is None:
+        return a is b
+    return (a.to_dict() if isinstance(a, Book) else a) == (b.to_dict() if isinstance(b, Book) else b)
+
+class DeltaSync:
+    def __init__(self, name, ds_id, parser, ttl, body=None, newest_first=False, make_row=None, mirror=None):
+        self.name = name
+        self.ds_id = ds_id
+        self.parser = parser
+        self.ttl = ttl
+        self.body = body or {}
+        self.newest_first = newest_first
+        self.mirror = mirror
+        self.rows = {}
+        self.created = {}
+        self.high_water = None
+        self.synced_at = 0.0
+        self.full_synced_at = 0.0
+        self.reconciled_at = 0.0
+        self.failed_at = 0.0
+        self.last_error = None
+        self.last_report = None
+        self.lock = threading.Lock()  # 只在合併、替換資料時持有，寫入不必等整段下載
+        self.sync_lock = threading.Lock()  # 同一時間只跑一次同步
+        self.during_sync = None  # 同步下載期間的 write-through，合併時重放
+        self.version = 0
+        if mirror:
+            # 連上次同步的時間一起還原：重開後資料還在 TTL 內就不用急著重抓
+            self.rows, self.created, self.high_water, self.full_synced_at, self.synced_at = mirror.load(name, ds_id, make_row)
+
+    def _query_body(self, since):
+        body = dict(self.body)
+        if since:
+            # Notion 的 last_edited_time 只精確到分鐘，用 on_or_after 才不會漏掉同一分鐘內的修改
+            body["filter"] = {"timestamp": "last_edited_time", "last_edited_time": {"on_or_after": since}}
+        return body
+
+    def sync(self, max_age=None, full=False):
+        with self.sync_lock:
+            now = time.time()
+            if max_age is not None and now - self.synced_at <= max_age:
+                return
+            started = time.perf_counter()
+            with self.lock:
+                full = full or not self.high_water or now - self.full_synced_at > FULL_RESYNC_SECONDS
+                rows = {} if full else dict(self.rows)
+                created = {} if full else dict(self.created)
+                high_water = None if full else self.high_water
+                self.during_sync = []
+            upserts, removed = {}, set()
+            report = ParseReport(self.name)
+            reconcile = not full and now - self.reconciled_at > RECONCILE_SECONDS
+            try:
+                # 下載和解析不持有 self.lock，這段時間的寫入照常即時生效
+                # 先掃 ID 再抓變動：掃完之後才新增的頁面一定會出現在增量結果裡，不會被誤刪
+                alive = self._alive_ids() if reconcile else None
+                types = self._property_types()
+                for results in iter_query_pages(self.ds_id, self._query_body(high_water)):
+                    for page, row in zip(results, self.parser(results, types, report)):
+                        edited = page.get("last_edited_time")
+                        if edited and (high_water is None or edited > high_water):
+                            high_water = edited
+                        self._merge(page, row, rows, created, upserts, removed)
+                if alive is not None:
+                    for page_id in [i for i in rows if i not in alive and i not in upserts]:
+                        self._merge({"id": page_id, "archived": True}, None, rows, created, upserts, removed)
+            except BaseException:
+                with self.lock:
+                    self.during_sync = None
+                raise
+            report.log()
+            self.last_report = report
+            with self.lock:
+                # 下載開始後才寫入的頁面比抓到的版本新，蓋回去
+                for page, row in self.during_sync:
+                    self._merge(page, row, rows, created, upserts, removed)
+                self.during_sync = None
+                if full:
+                    self.full_synced_at = now
+                if full or reconcile:
+                    self.reconciled_at = now
+                self._commit(rows, created, upserts, removed, high_water, replace=full, synced_at=now)
+                self.synced_at = now
+                self.last_error = None
+            get_metrics().observe("sync_seconds", time.perf_counter() - started, dataset=self.name, full=full)
+
+    def _alive_ids(self):
+        # 只要求 title 一個欄位，回應裡幾乎只剩頁面 ID
+        ids = set()
+        for results in iter_query_pages(self.ds_id, params={"filter_properties": "title"}):
+            ids.update(page["id"] for page in results)
+        return ids
+
+    def _property_types(self):
+        try:
+            return fetch_property_types(self.ds_id)
+        except Exception:
+            # 拿不到 schema 時退回用每個欄位值自帶的 type
+            return {}
+
+    def _merge(self, page, row, rows, created, upserts, removed):
+        if page.get("archived") or page.get("in_trash"):
+            row = None
+        # 同一頁可能先被下載到、又被重放的寫入刪掉（或反過來），只留最後一次的結果，鏡像才不會刪了又寫回去
+        if row is None:
+            rows.pop(page["id"], None)
+            created.pop(page["id"], None)
+            upserts.pop(page["id"], None)
+            removed.add(page["id"])
         else:
-            return {"error": f"連線錯誤: {response.text}"}
-    except Exception as e:
-        return {"error": str(e)}
+            rows[page["id"]] = row
+            created[page["id"]] = page.get("created_time")
+            upserts[page["id"]] = row
+            removed.discard(page["id"])
+
+    def _commit(self, rows, created, upserts, removed, high_water, replace=False, synced_at=None):
+        if self.newest_first:
+            rows = dict(sorted(rows.items(), key=lambda kv: created.get(kv[0]) or "", reverse=True))
+        if self.mirror:
+            self.mirror.save(
+                self.name, self.ds_id, upserts, created, removed, high_water, self.full_synced_at,
+                replace=replace, synced_at=self.synced_at if synced_at is None else synced_at,
+            )
+        # 合併完成後才整包替換，其他 session 讀到的永遠是完整的一份
+        # 同一分鐘內重抓到、內容沒變的頁面不算更新，版本號才不會每次同步都往上跳
+        changed = rows.keys() != self.rows.keys() or any(not same_row(self.rows.get(i), r) for i, r in upserts.items())
+        self.rows = rows
+        self.created = created
+        self.high_water = high_water
+        if changed:
+            self.version += 1
+
+    def apply(self, page):
+        # 寫入 API 成功後直接把回傳的頁面併進快取（write-through）；
+        # 高水位不動，別處在這段時間的修改下次增量同步仍會抓到
+        return self.apply_many([page])[0]
+
+    def apply_many(self, pages):
+        parsed = self.parser(pages, self._property_types(), ParseReport(self.name))
+        with self.lock:
+            rows, created = dict(self.rows), dict(self.created)
+            upserts, removed = {}, set()
+            for page, row in zip(pages, parsed):
+                self._merge(page, row, rows, created, upserts, removed)
+            if self.during_sync is not None:
+                self.during_sync.extend(zip(pages, parsed))
+            self._commit(rows, created, upserts, removed, self.high_water)
+            return [rows.get(page["id"]) for page in pages]
+
+    def due_in(self, now):
+        # 距離下次該同步還有幾秒；失敗過的同樣等一個 TTL 再重試
+        return max(self.synced_at, self.failed_at) + self.ttl - now
+
+    def try_sync(self):
+        try:
+            self.sync(max_age=self.ttl)
+        except Exception as e:
+            self.failed_at = time.time()
+            self.last_error = str(e)
+
+    def refresh_page(self, page_id):
+        return self.apply(fetch_page(page_id))
+
+    def invalidate(self):
+        self.synced_at = 0.0
 
-@st.cache_data(show_spinner=False, ttl=10)
-def fetch_logs():
-    if DEMO_MODE or not LOG_DS_ID:
-        return []
-    url = f"https://api.notion.com/v1/databases/{LOG_DS_ID}/query"
-    headers = {
-        "Authorization": f"Bearer {NOTION_TOKEN}",
-        "Notion-Version": "2022-06-28",
-        "Content-Type": "application/json",
-    }
-    try:
-        response = requests.post(url, headers=headers, json={"page_size": 100})
-        logs = []
-        if response.status_code == 200:
-            results = response.json().get("results", [])
-            for r in results:
-                props = r.get("properties", {})
-                d = get_date(props, LOG_DATE)
-                p = get_number(props, LOG_PAGES)
-                m = get_number(props, LOG_MINS)
-                if d:
-                    logs.append(
-                        {
-                            "id": r["id"],
-                            "date": d,
-                            "pages": p if p else 0,
-                            "mins": m if m else 0,
-                        }
-                    )
-        return logs
-    except:
-        return []
+# =========================
+# 1.3) 本機 SQLite 鏡像（冷啟動與離線時直接讀取）
+# =========================
+MIRROR_PATH = os.getenv(
+    "NOTION_MIRROR_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "notion_mirror.sqlite3"),
+)
 
-def fetch_todos():
-    if DEMO_MODE or not TODO_DS_ID:
-        return []
-    url = f"https://api.notion.com/v1/databases/{TODO_DS_ID}/query"
-    headers = {
-        "Authorization": f"Bearer {NOTION_TOKEN}",
-        "Notion-Version": "2022-06-28",
-        "Content-Type": "application/json",
-    }
-    try:
-        response = requests.post(
-            url,
-            headers=headers,
-            json={
-                "page_size": 100,
-                "sorts": [{"timestamp": "created_time", "direction": "descending"}],
-            },
-        )
-        todos = []
-        if response.status_code == 200:
-            results = response.json().get("results", [])
-            for r in results:
-                props = r.get("properties", {})
-                todos.append(
-                    {
-                        "id": r["id"],
-                        "name": get_plain_text(props, TODO_NAME),
-                        "done": get_checkbox(props, TODO_DONE),
-                        "due_date": get_date(props, TODO_DUE),
-                    }
+MIRROR_FIELDS = {
+    "books": ["title", "author", "status", "category", "genre", "tags", "cover", "publisher", "year", "isbn", "pages", "summary", "start_date", "end_date", "pdf"],
+    "logs": ["date", "pages", "mins"],
+    "todos": ["name", "done", "due_date"],
+}
+MIRROR_JSON_FIELDS = {"tags"}
+MIRROR_BOOL_FIELDS = {"done"}
+
+class Mirror:
+    def __init__(self, path):
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.lock = threading.Lock()
+        with self.lock:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            with self.conn:
+                self.conn.execute(
+                    "CREATE TABLE IF NOT EXISTS sync_state (dataset TEXT PRIMARY KEY, ds_id TEXT, high_water TEXT, full_synced_at REAL)"
+                )
+                # 舊版鏡像沒有 synced_at 欄位，補上即可
+                if "synced_at" not in {r[1] for r in self.conn.execute("PRAGMA table_info(sync_state)")}:
+                    self.conn.execute("ALTER TABLE sync_state ADD COLUMN synced_at REAL")
+                self.conn.execute("CREATE TABLE IF NOT EXISTS schema_cache (ds_id TEXT PRIMARY KEY, properties TEXT, fetched_at REAL)")
+                for name, fields in MIRROR_FIELDS.items():
+                    self.conn.execute(f"CREATE TABLE IF NOT EXISTS {name} (id TEXT PRIMARY KEY, created_time TEXT, {', '.join(fields)})")
+                self.conn.execute(
+                    "CREATE TABLE IF NOT EXISTS import_progress (job TEXT, row INTEGER, page_id TEXT, PRIMARY KEY (job, row))"
                 )
-        return todos
-    except:
-        return []
+
+    def _encode(self, field, value):
+        if field in MIRROR_JSON_FIELDS:
+            return json.dumps(list(value or ()), ensure_ascii=False)
+        if isinstance(value, date):
+            return value.isoformat()
+        return value
+
+    def _decode(self, field, value):
+        if field in MIRROR_JSON_FIELDS:
+            return json.loads(value) if value else []
+        if field in MIRROR_BOOL_FIELDS:
+            return bool(value)
+        return value
+
+    def load(self, name, ds_id, make_row=None):
+        fields = MIRROR_FIELDS[name]
+        with self.lock:
+            state = self.conn.execute(
+                "SELECT ds_id, high_water, full_synced_at, synced_at FROM sync_state WHERE dataset = ?", (name,)
+            ).fetchone()
+            # 換了資料庫 ID 就不能沿用舊鏡像；沒有 ID（離線/DEMO）時照樣讀出來顯示
+            if not state or (ds_id and state[0] != ds_id):
+                return {}, {}, None, 0.0, 0.0
+            cur = self.conn.execute(f"SELECT id, created_time, {', '.join(fields)} FROM {name} ORDER BY rowid")
+            rows, created = {}, {}
+            for r in cur:
+                row = {"id": r[0], **{f: self._decode(f, v) for f, v in zip(fields, r[2:])}}
+                rows[r[0]] = make_row(row) if make_row else row
+                created[r[0]] = r[1]
+        return rows, created, state[1], state[2] or 0.0, state[3] or 0.0
+
+    def save(self, name, ds_id, upserts, created, removed, high_water, full_synced_at, replace=False, synced_at=None):
+        fields = MIRROR_FIELDS[name]
+        cols = ", ".join(fields)
+        marks = ", ".join("?" for _ in fields)
+        updates = ", ".join(f"{f} = excluded.{f}" for f in fields)
+        with self.lock, self.conn:
+            if replace:
+                self.conn.execute(f"DELETE FROM {name}")
+            self.conn.executemany(f"DELETE FROM {name} WHERE id = ?", [(i,) for i in removed])
+            # 用 upsert 而不是 REPLACE，才能保留 rowid 也就是原本的排序
+            self.conn.executemany(
+                f"INSERT INTO {name} (id, created_time, {cols}) VALUES (?, ?, {marks}) "
+                f"ON CONFLICT(id) DO UPDATE SET created_time = excluded.created_time, {updates}",
+                [(i, created.get(i), *[self._encode(f, row.get(f)) for f in fields]) for i, row in upserts.items()],
+            )
+            self.conn.execute(
+                "INSERT OR REPLACE INTO sync_state (dataset, ds_id, high_water, full_synced_at, synced_at) VALUES (?, ?, ?, ?, ?)",
+                (name, ds_id, high_water, full_synced_at, synced_at),
+            )
+
+    def load_schema(self, ds_id):
+        with self.lock:
+            r = self.conn.execute("SELECT properties, fetched_at FROM schema_cache WHERE ds_id = ?", (ds_id,)).fetchone()
+        return (json.loads(r[0]), r[1]) if r else None
+
+    def save_schema(self, ds_id, properties, fetched_at):
+        with self.lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO schema_cache (ds_id, properties, fetched_at) VALUES (?, ?, ?)",
+                (ds_id, json.dumps(properties, ensure_ascii=False), fetched_at),
+            )
+
+    def imported_rows(self, job):
+        with self.lock:
+            return {r[0] for r in self.conn.execute("SELECT row FROM import_progress WHERE job = ?", (job,))}
+
+    def mark_imported(self, job, row, page_id):
+        with self.lock, self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO import_progress (job, row, page_id) VALUES (?, ?, ?)", (job, row, page_id))
+
+@st.cache_resource(show_spinner=False)
+def get_mirror():
+    return Mirror(MIRROR_PATH)
+
+SYNC_DATASETS = {
+    "books": {"ds_id": BOOK_DS_ID, "parser": parse_books, "ttl": 60, "make_row": Book.from_dict},
+    "logs": {"ds_id": LOG_DS_ID, "parser": parse_logs, "ttl": 10},
+    "todos": {
+        "ds_id": TODO_DS_ID,
+        "parser": parse_todos,
+        "ttl": 60,  # 寫入走 write-through，這裡只負責對帳其他地方做的修改
+        "body": {"sorts": [{"timestamp": "created_time", "direction": "descending"}]},
+        "newest_first": True,
+    },
+}
+
+@st.cache_resource(show_spinner=False)
+def get_delta_sync(name):
+    return DeltaSync(name, mirror=get_mirror(), **SYNC_DATASETS[name])
 
 def add_todo_task(task_name, due_date=None):
     if DEMO_MODE or not TODO_DS_ID:
         return False, "未設定資料庫 ID"
-    url = "https://api.notion.com/v1/pages"
-    headers = {
-        "Authorization": f"Bearer {NOTION_TOKEN}",
-        "Notion-Version": "2022-06-28",
-        "Content-Type": "application/json",
-    }
-
     props = {
         TODO_NAME: {"title": [{"text": {"content": task_name}}]},
         TODO_DONE: {"checkbox": False},
@@ -295,12 +1072,12 @@ def add_todo_task(task_name, due_date=None):
         props[TODO_DUE] = {"date": {"start": str(due_date)}}
 
     try:
-        response = requests.post(
-            url,
-            headers=headers,
+        response = get_notion_client().post(
+            "/pages",
             json={"parent": {"database_id": TODO_DS_ID}, "properties": props},
         )
         if response.status_code == 200:
+            apply_writes("todos", [response.json()])
             return True, ""
         else:
             return False, response.text
@@ -310,86 +1087,174 @@ def add_todo_task(task_name, due_date=None):
 def mark_todo_done(page_id):
     if DEMO_MODE:
         return False
-    url = f"https://api.notion.com/v1/pages/{page_id}"
-    headers = {
-        "Authorization": f"Bearer {NOTION_TOKEN}",
-        "Notion-Version": "2022-06-28",
-        "Content-Type": "application/json",
-    }
-
     props = {TODO_DONE: {"checkbox": True}}
     try:
-        response = requests.patch(url, headers=headers, json={"properties": props})
-        return response.status_code == 200
+        response = get_notion_client().patch(f"/pages/{page_id}", json={"properties": props})
+        if response.status_code != 200:
+            return False
+        apply_writes("todos", [response.json()])
+        return True
     except:
         return False
 
-def add_log_to_notion(date_val, book_id, pages, mins):
-    if DEMO_MODE or not LOG_DS_ID:
-        return False
-    url = "https://api.notion.com/v1/pages"
-    headers = {
-        "Authorization": f"Bearer {NOTION_TOKEN}",
-        "Notion-Version": "2022-06-28",
-        "Content-Type": "application/json",
-    }
+def apply_writes(dataset, pages):
+    # write-through：全量快取與行事曆的月份快取一起更新
+    if dataset == "books":
+        get_result_cache().clear("library_query")
+        if LIBRARY_PUSHDOWN:
+            # notion 模式不在本機保留整份書單，清掉查詢結果讓書庫重抓即可
+            rows = parse_books(pages, fetch_property_types(BOOK_DS_ID))
+            return [None if p.get("archived") or p.get("in_trash") else row for p, row in zip(pages, rows)]
+    rows = get_delta_sync(dataset).apply_many(pages)
+    get_month_cache().apply(dataset, pages, rows)
+    worker = get_sync_worker()
+    worker.publish()
+    worker.kick()  # 讓背景執行緒把索引跟上這次寫入
+    return rows
+
+def create_page(ds_id, props):
+    try:
+        response = get_notion_client().post(
+            "/pages",
+            json={"parent": {"database_id": ds_id}, "properties": props},
+        )
+        if response.status_code == 200:
+            return True, response.json()
+        return False, response.text
+    except Exception as e:
+        return False, str(e)
 
-    props = {
+def log_props(date_val, book_id, pages, mins):
+    return {
         LOG_DATE: {"date": {"start": str(date_val)}},
         LOG_PAGES: {"number": int(pages)},
         LOG_MINS: {"number": int(mins)},
         LOG_BOOK: {"relation": [{"id": book_id}]},
         "名稱": {"title": [{"text": {"content": f"Log {str(date_val)}"}}]},
     }
-    try:
-        response = requests.post(
-            url,
-            headers=headers,
-            json={"parent": {"database_id": LOG_DS_ID}, "properties": props},
-        )
-        return response.status_code == 200
-    except:
+
+def add_log_to_notion(date_val, book_id, pages, mins):
+    if DEMO_MODE or not LOG_DS_ID:
+        return False
+    ok, page = create_page(LOG_DS_ID, log_props(date_val, book_id, pages, mins))
+    if not ok:
         return False
+    apply_writes("logs", [page])
+    return True
+
+SCHEMA_TTL = 300
+
+class SchemaCache:
+    # 和 DeltaSync.read 一樣：過期先回傳舊的 schema，背景再去更新；只有完全沒有時才等網路
+    def __init__(self, ttl, mirror=None):
+        self.ttl = ttl
+        self.mirror = mirror
+        self.entries = {}  # ds_id -> (properties, fetched_at)
+        self.failed_at = {}
+        self.refreshing = set()
+        self.version = 0
+        self.lock = threading.Lock()
+
+    def _fetch(self, ds_id):
+        response = get_notion_client().get(f"/databases/{ds_id}")
+        if response.status_code != 200:
+            raise NotionError(f"連線錯誤: {response.text}")
+        props = response.json().get("properties", {})
+        now = time.time()
+        with self.lock:
+            old = self.entries.get(ds_id)
+            self.entries[ds_id] = (props, now)
+            if not old or old[0] != props:
+                self.version += 1
+        if self.mirror:
+            self.mirror.save_schema(ds_id, props, now)
+        return props
+
+    def refresh(self, ds_id):
+        try:
+            self._fetch(ds_id)
+        except Exception:
+            self.failed_at[ds_id] = time.time()
+        finally:
+            with self.lock:
+                self.refreshing.discard(ds_id)
+
+    def _entry(self, ds_id):
+        entry = self.entries.get(ds_id)
+        if entry is None and self.mirror:
+            entry = self.mirror.load_schema(ds_id)
+            if entry:
+                with self.lock:
+                    self.entries.setdefault(ds_id, entry)
+        return entry
+
+    def peek(self, ds_id):
+        # 不碰網路，只看手上有的
+        entry = self._entry(ds_id)
+        return entry[0] if entry else None
+
+    def due_in(self, ds_id, now):
+        entry = self._entry(ds_id)
+        return max(entry[1] if entry else 0.0, self.failed_at.get(ds_id, 0.0)) + self.ttl - now
+
+    def get(self, ds_id):
+        entry = self._entry(ds_id)
+        if entry is None:
+            get_metrics().incr("cache_requests_total", cache="schema", result="miss")
+            return self._fetch(ds_id)
+        now = time.time()
+        result = "hit"
+        if now - entry[1] > self.ttl and now - self.failed_at.get(ds_id, 0.0) > self.ttl:
+            result = "stale"
+            with self.lock:
+                start = ds_id not in self.refreshing
+                self.refreshing.add(ds_id)
+            if start:
+                threading.Thread(target=self.refresh, args=(ds_id,), daemon=True).start()
+        get_metrics().incr("cache_requests_total", cache="schema", result=result)
+        return entry[0]
+
+    def invalidate(self):
+        # 標成過期即可，下一次讀取照樣先拿舊值、背景更新
+        with self.lock:
+            self.entries = {ds_id: (props, 0.0) for ds_id, (props, _) in self.entries.items()}
+
+@st.cache_resource(show_spinner=False)
+def get_schema_cache():
+    return SchemaCache(SCHEMA_TTL, mirror=get_mirror())
+
+def fetch_database_properties(ds_id):
+    return get_schema_cache().get(ds_id)
+
+def fetch_property_types(ds_id):
+    return {name: p.get("type") for name, p in fetch_database_properties(ds_id).items()}
+
+def schema_options(props):
+    def extract_options(prop_name, type_key):
+        prop = props.get(prop_name, {})
+        if type_key in ["select", "multi_select"]:
+            return [o["name"] for o in prop.get(type_key, {}).get("options", [])]
+        if type_key == "status":
+            return [o["name"] for o in prop.get("status", {}).get("options", [])]
+        return []
+
+    s_opts = extract_options(PROP_STATUS, "select")
+    if not s_opts:
+        s_opts = extract_options(PROP_STATUS, "status")
+    c_opts = extract_options(PROP_CATEGORY, "select")
+    g_opts = extract_options(PROP_GENRE, "select")
+    t_opts = extract_options(PROP_TAGS, "multi_select")
+    return s_opts, c_opts, g_opts, t_opts
 
-@st.cache_data(show_spinner=False, ttl=300)
 def fetch_database_schema():
     if DEMO_MODE:
         return [], [], [], []
-    url = f"https://api.notion.com/v1/databases/{BOOK_DS_ID}"
-    headers = {"Authorization": f"Bearer {NOTION_TOKEN}", "Notion-Version": "2022-06-28"}
     try:
-        response = requests.get(url, headers=headers)
-        if response.status_code != 200:
-            return [], [], [], []
-        props = response.json().get("properties", {})
-
-        def extract_options(prop_name, type_key):
-            prop = props.get(prop_name, {})
-            if type_key in ["select", "multi_select"]:
-                return [o["name"] for o in prop.get(type_key, {}).get("options", [])]
-            if type_key == "status":
-                return [o["name"] for o in prop.get("status", {}).get("options", [])]
-            return []
-
-        s_opts = extract_options(PROP_STATUS, "select")
-        if not s_opts:
-            s_opts = extract_options(PROP_STATUS, "status")
-        c_opts = extract_options(PROP_CATEGORY, "select")
-        g_opts = extract_options(PROP_GENRE, "select")
-        t_opts = extract_options(PROP_TAGS, "multi_select")
-        return s_opts, c_opts, g_opts, t_opts
+        return schema_options(fetch_database_properties(BOOK_DS_ID))
     except:
         return [], [], [], []
 
-def add_book_to_notion(data):
-    if DEMO_MODE:
-        return False
-    url = "https://api.notion.com/v1/pages"
-    headers = {
-        "Authorization": f"Bearer {NOTION_TOKEN}",
-        "Notion-Version": "2022-06-28",
-        "Content-Type": "application/json",
-    }
+def book_props(data):
     props = {
         PROP_TITLE: {"title": [{"text": {"content": data["title"]}}]},
         PROP_STATUS: {"select": {"name": data["status"]}},
@@ -412,27 +1277,266 @@ def add_book_to_notion(data):
     if data["end_date"]:
         props[PROP_END_DATE] = {"date": {"start": str(data["end_date"])}}
 
-    props = {k: v for k, v in props.items() if v is not None}
-    try:
-        response = requests.post(
-            url,
-            headers=headers,
-            json={"parent": {"database_id": BOOK_DS_ID}, "properties": props},
-        )
-        if response.status_code == 200:
+    return {k: v for k, v in props.items() if v is not None}
+
+def add_book_to_notion(data):
+    if DEMO_MODE:
+        return False
+    ok, page = create_page(BOOK_DS_ID, book_props(data))
+    if not ok:
+        st.error(f"新增失敗: {page}")
+        return False
+    apply_writes("books", [page])
+    return True
+
+def invalidate(dataset, key=None):
+    # 只作廢受影響的那一份資料（或那一頁），不再 st.cache_data.clear() 清掉所有人的快取
+    if dataset == "schema":
+        get_schema_cache().invalidate()
+        get_sync_worker().kick()
+        return
+    if dataset == "books":
+        get_result_cache().clear("library_query")
+        if LIBRARY_PUSHDOWN:
+            return apply_writes("books", [fetch_page(key)])[0] if key else None
+    if key is None:
+        get_delta_sync(dataset).invalidate()
+        get_sync_worker().kick()
+    else:
+        row = get_delta_sync(dataset).refresh_page(key)
+        get_sync_worker().publish()
+        return row
+
+# =========================
+# 1.4) 背景同步（整個 process 一條執行緒依排程同步，發布唯讀快照給所有 session；
+#       資料集要有頁面用到才開始載入與同步）
+# =========================
+SYNC_STORES = ("books", "logs", "todos")
+SYNC_MIN_WAIT = 1  # 排程最短間隔，避免失敗時空轉
+SYNC_FIRST_WAIT = 120  # 冷啟動又沒有鏡像時，最多等第一次同步這麼久
+REFRESH_POLL_SECONDS = 2
+
+# local：本機同步整份書單、用索引篩選；notion：書庫每次篩選都交給 Notion，
+# 書庫、計時、行事曆和書籍寫入都不碰整份書單。儀表板（總數、分類圖）和批次匯入（用書名找書）
+# 本來就要每一本書，打開這兩頁時仍會載入並同步整份書單
+LIBRARY_QUERY_MODE = os.getenv("LIBRARY_QUERY_MODE", "local")
+LIBRARY_PUSHDOWN = LIBRARY_QUERY_MODE == "notion" and not DEMO_MODE
+BOOK_PICKER = () if LIBRARY_PUSHDOWN else ("books",)  # 計時、行事曆的選書下拉選單
+
+# 每個頁面用到哪些資料；沒列到的資料集不讀鏡像、不打 Notion
+PAGE_DATASETS = {
+    "dashboard": ("books", "logs", "todos"),
+    "library": ("schema",) if LIBRARY_PUSHDOWN else ("books", "schema"),
+    "book_detail": (),
+    "calendar": BOOK_PICKER,  # 月曆走月份查詢；logs 等打開年度熱圖才載入
+    "timer": BOOK_PICKER,
+    "todo": ("todos",),
+    "import": ("books", "schema"),
+}
+
+@dataclass(frozen=True)
+class DataSnapshot:
+    books: object = ()
+    schema: tuple = ([], [], [], [])
+    logs: tuple = ()
+    todos: tuple = ()
+    versions: tuple = ()  # ((資料集, 版本), ...)；內容有變版本才會變
+    synced_at: object = None  # 最舊那份資料的同步時間；從沒同步過是 None
+
+    @property
+    def age(self):
+        return time.time() - self.synced_at if self.synced_at else None
+
+    def version_of(self, datasets):
+        versions = dict(self.versions)
+        return tuple(versions.get(name) for name in datasets)
+
+class SyncWorker:
+    def __init__(self, get_store, schema):
+        self.get_store = get_store
+        self.schema = schema
+        self.stores = {}
+        self.wanted = set()
+        self.indexes = {}  # 資料集 -> 跟著它更新的衍生索引（有 sync_from(store)）
+        self.snapshot = DataSnapshot()
+        self.busy = False
+        self.pending = False  # 被叫醒、下一輪同步還沒開始
+        self.wake = threading.Event()
+        self.published = threading.Condition()
+        self.lock = threading.Lock()
+        self.pool = ThreadPoolExecutor(max_workers=len(SYNC_STORES))
+
+    def start(self):
+        if not DEMO_MODE:
+            threading.Thread(target=self._run, name="notion-sync", daemon=True).start()
+        return self
+
+    def _loaded(self, name):
+        if DEMO_MODE:
             return True
-        else:
-            st.error(f"新增失敗: {response.text}")
-            return False
-    except Exception as e:
-        st.error(f"連線失敗: {str(e)}")
+        if name == "schema":
+            return self.schema.peek(BOOK_DS_ID) is not None or bool(self.schema.failed_at.get(BOOK_DS_ID))
+        s = self.stores[name]
+        return bool(not s.ds_id or s.rows or s.synced_at or s.failed_at)
+
+    def require(self, datasets):
+        # 第一次有人要某個資料集時才讀鏡像、排進同步；鏡像是空的就等背景第一次下載
+        with self.lock:
+            added = [name for name in datasets if name not in self.wanted]
+            for name in added:
+                self.wanted.add(name)
+                if name != "schema":
+                    self.stores[name] = self.get_store(name)
+        if added:
+            self.publish()
+            self.kick()
+        if all(self._loaded(name) for name in datasets):
+            return True
+        with self.published:
+            self.published.wait_for(lambda: all(self._loaded(name) for name in datasets), SYNC_FIRST_WAIT)
         return False
 
-def refresh_data():
-    st.cache_data.clear()
-    st.rerun()
+    def _schema_ids(self):
+        with self.lock:
+            ids = [s.ds_id for s in self.stores.values() if s.ds_id]
+            if "schema" in self.wanted and BOOK_DS_ID not in ids:
+                ids.append(BOOK_DS_ID)
+        return ids
+
+    def active_stores(self):
+        with self.lock:
+            return [s for s in self.stores.values() if s.ds_id]
+
+    def _run(self):
+        while True:
+            self.wake.clear()
+            try:
+                self.tick()
+            except RuntimeError as e:
+                # 直譯器正在結束，執行緒池不再收工作；其他 RuntimeError 一樣要記下來
+                if sys.is_finalizing() or "cannot schedule new futures" in str(e):
+                    return
+                logger.exception("背景同步失敗")
+            except Exception:
+                logger.exception("背景同步失敗")
+            now = time.time()
+            waits = [s.due_in(now) for s in self.active_stores()]
+            waits += [self.schema.due_in(ds_id, now) for ds_id in self._schema_ids()]
+            # 還沒有頁面要資料時就一直睡到被叫醒
+            self.wake.wait(max(min(waits), SYNC_MIN_WAIT) if waits else None)
+
+    def tick(self):
+        now = time.time()
+        self.busy = True
+        self.pending = False
+        try:
+            # 先更新 schema（解析要用欄位型別），再讓到期的資料集同時同步
+            list(self.pool.map(self.schema.refresh, [i for i in self._schema_ids() if self.schema.due_in(i, now) <= 0]))
+            list(self.pool.map(DeltaSync.try_sync, [s for s in self.active_stores() if s.due_in(now) <= 0]))
+            self.update_indexes()
+        finally:
+            self.busy = False
+        self.publish()
+
+    def kick(self):
+        self.pending = True
+        self.wake.set()
+
+    def add_index(self, name, index):
+        with self.lock:
+            indexes = self.indexes.setdefault(name, [])
+            if index in indexes:
+                return
+            indexes.append(index)
+        self.kick()
+
+    def update_indexes(self):
+        # 索引在背景執行緒跟著資料更新，session 讀的時候已經建好
+        with self.lock:
+            work = [(index, self.stores[name]) for name, indexes in self.indexes.items() if name in self.stores for index in indexes]
+        for index, store in work:
+            index.sync_from(store)
+
+    def publish(self):
+        # 每份快照都是新物件，舊快照照樣可以被還在渲染的 session 讀；版本沒變的資料集沿用原本的 tuple
+        with self.lock:
+            old = self.snapshot
+            old_versions = dict(old.versions)
+            stores = dict(self.stores)
+            versions = tuple(sorted((name, s.version) for name, s in stores.items()))
+            if "schema" in self.wanted:
+                versions += (("schema", self.schema.version),)
+
+            def rows_of(name):
+                store = stores.get(name)
+                if store is None:
+                    return ()
+                if store.rows and old_versions.get(name) == store.version:
+                    return getattr(old, name)
+                return tuple(store.rows.values())
+
+            books = rows_of("books")
+            if not books and "books" in stores and stores["books"].last_error:
+                books = {"error": stores["books"].last_error}
+            schema = old.schema
+            if "schema" in self.wanted and not DEMO_MODE and old_versions.get("schema") != self.schema.version:
+                schema = schema_options(self.schema.peek(BOOK_DS_ID) or {})
+            synced = [s.synced_at for s in stores.values() if s.ds_id and s.synced_at]
+            self.snapshot = DataSnapshot(
+                books=books,
+                schema=schema,
+                logs=rows_of("logs"),
+                todos=rows_of("todos"),
+                versions=versions,
+                synced_at=min(synced) if synced else None,
+            )
+        with self.published:
+            self.published.notify_all()
+        return self.snapshot
+
+@st.cache_resource(show_spinner=False)
+def get_sync_worker():
+    return SyncWorker(get_delta_sync, get_schema_cache()).start()
+
+def load_snapshot(datasets):
+    worker = get_sync_worker()
+    result = "hit" if worker.require(datasets) else "miss"
+    get_metrics().incr("cache_requests_total", cache="snapshot", result=result)
+    return worker.snapshot
+
+def refreshing():
+    worker = get_sync_worker()
+    return worker.busy or worker.pending
+
+def refresh_failed():
+    return any(s.last_error for s in get_sync_worker().active_stores())
+
+def format_age(seconds):
+    if seconds < 60:
+        return f"{int(seconds)} 秒前"
+    if seconds < 3600:
+        return f"{int(seconds // 60)} 分鐘前"
+    if seconds < 86400:
+        return f"{int(seconds // 3600)} 小時前"
+    return f"{int(seconds // 86400)} 天前"
+
+def snapshot_changed():
+    datasets = PAGE_DATASETS.get(st.session_state.page, ())
+    return get_sync_worker().snapshot.version_of(datasets) != st.session_state.get("rendered_version")
+
+def watch_refresh():
+    # 這一頁用到的資料有新版本就重畫；背景更新結束也重畫一次，輪詢才會停掉
+    if snapshot_changed() or not refreshing():
+        st.rerun()
+
+if "page" not in st.session_state:
+    st.session_state.page = "dashboard"
+st.session_state.dialog_open = False  # 對話框的函式被呼叫時才會設成 True
 
-books_data = fetch_books()
+page_datasets = PAGE_DATASETS.get(st.session_state.page, ())
+snapshot = load_snapshot(page_datasets)
+st.session_state.rendered_version = snapshot.version_of(page_datasets)
+books_data = snapshot.books
 error_message = None
 books = []
 if isinstance(books_data, dict) and "error" in books_data:
@@ -440,12 +1544,856 @@ if isinstance(books_data, dict) and "error" in books_data:
 else:
     books = books_data
 
-schema_status, schema_cat, schema_gen, schema_tags = fetch_database_schema()
+schema_status, schema_cat, schema_gen, schema_tags = snapshot.schema
 opt_status = schema_status
 opt_cat = schema_cat
 opt_gen = schema_gen
 opt_tag = schema_tags
 
+# =========================
+# 1.5) 批次匯入（CSV / JSON 串流讀取、驗證、並行寫入、可續傳）
+# =========================
+IMPORT_WORKERS = 3  # 實際速度由共用 client 的 token bucket 控制，這裡只決定同時有幾個請求在路上
+IMPORT_WINDOW = 12
+IMPORT_COLUMNS = {
+    "logs": {
+        "date": ["date", "日期"],
+        "book": ["book", "書名", "書籍", "書籍關聯"],
+        "pages": ["pages", "頁數"],
+        "mins": ["mins", "minutes", "分鐘數"],
+    },
+    "books": {
+        "title": ["title", "名稱", "書名"],
+        "author": ["author", "作者"],
+        "status": ["status", "閱讀狀態"],
+        "category": ["category", "分類"],
+        "genre": ["genre", "類別"],
+        "tags": ["tags", "分類標籤"],
+        "cover_url": ["cover_url", "cover", "封面"],
+        "pdf_url": ["pdf_url", "pdf", "PDF"],
+        "summary": ["summary", "簡介"],
+        "start_date": ["start_date", "開始閱讀"],
+        "end_date": ["end_date", "讀完日期"],
+    },
+}
+
+def iter_import_rows(fileobj, filename):
+    fileobj.seek(0)
+    text = io.TextIOWrapper(fileobj, encoding="utf-8-sig", newline="")
+    try:
+        name = filename.lower()
+        if name.endswith(".csv"):
+            yield from csv.DictReader(text)
+        elif name.endswith((".jsonl", ".ndjson")):
+            for line in text:
+                if not line.strip():
+                    continue
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    yield {"_error": "JSON 格式錯誤"}
+        else:
+            data = json.load(text)
+            yield from (data if isinstance(data, list) else data.get("rows", []))
+    finally:
+        # 不要讓 TextIOWrapper 被回收時順手關掉上傳的檔案
+        text.detach()
+
+def normalize_import_row(kind, raw):
+    row = {}
+    for field, names in IMPORT_COLUMNS[kind].items():
+        value = next((raw[n] for n in names if raw.get(n) not in (None, "")), "")
+        row[field] = value.strip() if isinstance(value, str) else value
+    return row
+
+def parse_import_date(value, label):
+    if not value:
+        return None
+    for fmt in ("%Y-%m-%d", "%Y/%m/%d"):
+        try:
+            return datetime.strptime(str(value)[:10], fmt).date()
+        except ValueError:
+            pass
+    raise ValueError(f"{label}格式錯誤: {value}")
+
+def parse_import_count(value, label):
+    try:
+        n = int(float(value or 0))
+    except ValueError:
+        raise ValueError(f"{label}不是數字: {value}")
+    if n < 0:
+        raise ValueError(f"{label}不可為負數")
+    return n
+
+def make_import_validator(kind, books):
+    s_opts, c_opts, g_opts, t_opts = fetch_database_schema()
+
+    if kind == "logs":
+        by_title = {}
+        for b in books:
+            by_title.setdefault(b["title"], []).append(b["id"])
+        book_ids = {b["id"] for b in books}
+
+        def validate_log(raw):
+            row = normalize_import_row("logs", raw)
+            d = parse_import_date(row["date"], "日期")
+            if not d:
+                raise ValueError("缺少日期")
+            book = str(row["book"])
+            if book in book_ids:
+                book_id = book
+            elif len(by_title.get(book, [])) == 1:
+                book_id = by_title[book][0]
+            elif book in by_title:
+                raise ValueError(f"書名重複，請改用書籍 ID: {book}")
+            else:
+                raise ValueError(f"找不到書籍: {book}")
+            return log_props(d, book_id, parse_import_count(row["pages"], "頁數"), parse_import_count(row["mins"], "分鐘數"))
+
+        return validate_log
+
+    def check_option(value, options, label):
+        if options and value not in options:
+            raise ValueError(f"{label}不在選項中: {value}")
+        return value
+
+    def validate_book(raw):
+        row = normalize_import_row("books", raw)
+        if not row["title"]:
+            raise ValueError("缺少書名")
+        tags = row["tags"]
+        if isinstance(tags, str):
+            tags = [t.strip() for t in re.split(r"[,;、，]", tags) if t.strip()]
+        data = {
+            "title": row["title"],
+            "author": row["author"],
+            "status": check_option(row["status"] or (s_opts[0] if s_opts else ""), s_opts, "狀態"),
+            "category": row["category"] or "未分類",
+            "genre": row["genre"] or "未分類",
+            "tags": [check_option(t, t_opts, "標籤") for t in tags],
+            "cover_url": row["cover_url"],
+            "pdf_url": row["pdf_url"],
+            "summary": row["summary"],
+            "start_date": parse_import_date(row["start_date"], "開始閱讀"),
+            "end_date": parse_import_date(row["end_date"], "讀完日期"),
+        }
+        if data["category"] != "未分類":
+            check_option(data["category"], c_opts, "分類")
+        if data["genre"] != "未分類":
+            check_option(data["genre"], g_opts, "類別")
+        return book_props(data)
+
+    return validate_book
+
+def run_import(kind, fileobj, filename, books, on_progress=None):
+    ds_id = LOG_DS_ID if kind == "logs" else BOOK_DS_ID
+    fileobj.seek(0)
+    job = f"{kind}:{hashlib.sha1(fileobj.read()).hexdigest()[:16]}"
+    mirror = get_mirror()
+    done_rows = mirror.imported_rows(job)
+    total = sum(1 for _ in iter_import_rows(fileobj, filename))
+    validate = make_import_validator(kind, books)
+    result = {"job": job, "total": total, "imported": 0, "skipped": 0, "failed": []}
+    created = []
+    processed = 0
+
+    def finish(futures):
+        nonlocal processed
+        for f in futures:
+            n, raw = pending.pop(f)
+            ok, page = f.result()
+            if ok:
+                mirror.mark_imported(job, n, page["id"])
+                created.append(page)
+                result["imported"] += 1
+            else:
+                result["failed"].append({**raw, "row": n, "error": page})
+            processed += 1
+        if on_progress:
+            on_progress(processed, total)
+
+    pending = {}
+    with ThreadPoolExecutor(max_workers=IMPORT_WORKERS) as pool:
+        try:
+            for n, raw in enumerate(iter_import_rows(fileobj, filename), start=1):
+                if n in done_rows:
+                    # 上次已經成功寫入的列，重跑同一個檔案時直接略過
+                    result["skipped"] += 1
+                    processed += 1
+                    continue
+                if not isinstance(raw, dict):
+                    raw = {"_error": "資料列格式錯誤"}
+                try:
+                    if "_error" in raw:
+                        raise ValueError(raw["_error"])
+                    props = validate(raw)
+                except Exception as e:
+                    # JSON 欄位型別不對（例如頁數是陣列）也只算這一列失敗
+                    result["failed"].append({**raw, "row": n, "error": str(e)})
+                    processed += 1
+                    continue
+                pending[pool.submit(create_page, ds_id, props)] = (n, raw)
+                if len(pending) >= IMPORT_WINDOW:
+                    finish(wait(pending, return_when=FIRST_COMPLETED).done)
+            while pending:
+                finish(wait(pending).done)
+        finally:
+            # 中途被打斷（例如使用者操作觸發 rerun）時，已送出的寫入照樣記下來，重跑才不會重複建立
+            for f in list(pending):
+                n, raw = pending.pop(f)
+                ok, page = f.result()
+                if ok:
+                    mirror.mark_imported(job, n, page["id"])
+                    created.append(page)
+            if created:
+                apply_writes(kind, created)
+
+    if on_progress:
+        on_progress(total, total)
+    return result
+
+def import_report_csv(failed):
+    out = io.StringIO()
+    # csv.DictReader 把比表頭多出來的欄位放在 None 底下，這種 key 不輸出
+    extra = {k for r in failed for k in r if isinstance(k, str) and not k.startswith("_")} - {"row", "error"}
+    writer = csv.DictWriter(out, fieldnames=["row", "error"] + sorted(extra), extrasaction="ignore")
+    writer.writeheader()
+    writer.writerows(failed)
+    return out.getvalue().encode("utf-8-sig")
+
+
+# =========================
+# 1.6) 全文搜尋索引（字元 n-gram，中文書名不需斷詞）
+# =========================
+SEARCH_FIELDS = {"title": 3.0, "author": 2.0, "tags": 1.5, "publisher": 1.0, "summary": 0.5}
+SEARCH_CACHE_SIZE = 64
+
+def normalize_search_text(text):
+    return " ".join(unicodedata.normalize("NFKC", text).lower().split())
+
+def text_ngrams(text):
+    # 單字 + 雙字：一個字的查詢走單字表，兩個字以上用雙字表做交集
+    grams = set(text) - {" "}
+    grams.update(text[i : i + 2] for i in range(len(text) - 1))
+    return grams
+
+class SearchIndex:
+    def __init__(self):
+        self.postings = {}
+        self.doc_grams = {}
+        self.doc_sig = {}
+        self.order = {}
+        self.version = None
+        self.cache = {}
+        self.lock = threading.Lock()
+
+    def _signature(self, book):
+        return tuple(tuple(book.get(f) or ()) if f == "tags" else book.get(f) or "" for f in SEARCH_FIELDS)
+
+    def _remove(self, doc_id):
+        for gram in self.doc_grams.pop(doc_id, ()):
+            posting = self.postings.get(gram)
+            if posting:
+                posting.pop(doc_id, None)
+                if not posting:
+                    del self.postings[gram]
+        self.doc_sig.pop(doc_id, None)
+
+    def _add(self, book, sig):
+        scores = {}
+        for (field, weight), value in zip(SEARCH_FIELDS.items(), sig):
+            text = normalize_search_text(" ".join(value) if field == "tags" else value)
+            for gram in text_ngrams(text):
+                scores[gram] = scores.get(gram, 0.0) + weight
+        for gram, score in scores.items():
+            self.postings.setdefault(gram, {})[book["id"]] = score
+        self.doc_grams[book["id"]] = tuple(scores)
+        self.doc_sig[book["id"]] = sig
+
+    def sync_from(self, store):
+        # 先讀 version 再讀 rows：rows 只會比 version 新，下次版本變了會再對一次
+        version = store.version
+        if version == self.version:
+            return
+        with self.lock:
+            if version == self.version:
+                return
+            rows = store.rows
+            for doc_id in list(self.doc_sig):
+                if doc_id not in rows:
+                    self._remove(doc_id)
+            for doc_id, book in rows.items():
+                sig = self._signature(book)
+                if self.doc_sig.get(doc_id) != sig:
+                    self._remove(doc_id)
+                    self._add(book, sig)
+            self.order = {doc_id: i for i, doc_id in enumerate(rows)}
+            self.cache = {}
+            self.version = version
+
+    def scan(self, query, rows):
+        # 索引還沒建好時的退路：逐本比對，沒有分數排序
+        terms = normalize_search_text(query).split()
+        out = []
+        for book in rows:
+            text = normalize_search_text(" ".join(" ".join(v) if isinstance(v, tuple) else v for v in self._signature(book)))
+            if all(t in text for t in terms):
+                out.append(book["id"])
+        return out
+
+    def search(self, query):
+        q = normalize_search_text(query)
+        if not q:
+            return []
+        # 背景執行緒會就地更新 posting，查詢時持有同一把鎖
+        with self.lock:
+            return self._search(q)
+
+    def _search(self, q):
+        key = (self.version, q)
+        if key in self.cache:
+            get_metrics().incr("cache_requests_total", cache="search", result="hit")
+            return self.cache[key]
+        get_metrics().incr("cache_requests_total", cache="search", result="miss")
+        # 每個詞各自比對（不同詞可以落在不同欄位，例如書名 + 作者），分數是所有詞的 n-gram 分數總和
+        postings = []
+        for term in q.split():
+            grams = {term} if len(term) == 1 else {term[i : i + 2] for i in range(len(term) - 1)}
+            postings.extend(self.postings.get(g, {}) for g in grams)
+        # 從最短的 posting 開始逐一檢查其他表，不複製整張表、也不建中間結果
+        postings.sort(key=len)
+        first, rest = postings[0], postings[1:]
+        scores = {}
+        for doc_id, score in first.items():
+            for posting in rest:
+                s = posting.get(doc_id)
+                if s is None:
+                    break
+                score += s
+            else:
+                scores[doc_id] = score
+        # 兩次內建 key 的穩定排序：先照書單順序，再照分數高低
+        result = sorted(scores, key=self.order.__getitem__)
+        result.sort(key=scores.__getitem__, reverse=True)
+        # 每次 rerun 都會帶著同一個搜尋字串重跑，記住最近的結果
+        if len(self.cache) >= SEARCH_CACHE_SIZE:
+            self.cache.pop(next(iter(self.cache)))
+        self.cache[key] = result
+        return result
+
+@st.cache_resource(show_spinner=False)
+def get_search_index():
+    return SearchIndex()
+
+def search_books(query):
+    index = get_search_index()
+    if DEMO_MODE:
+        index.sync_from(get_delta_sync("books"))
+    else:
+        # 第一次有人搜尋才把索引交給背景執行緒建立、維護，不在請求裡建
+        get_sync_worker().add_index("books", index)
+    if index.version is None:
+        return index.scan(query, books)
+    return index.search(query)
+
+# =========================
+# 1.7) 篩選 facet 索引（每個選項一個 bitset，組合篩選 = 位元 AND）
+# =========================
+FACET_FIELDS = {"status": "狀態", "category": "分類", "genre": "類別", "tags": "標籤"}
+
+class FacetState:
+    # 一個資料版本的完整篩選表，建好後不再修改；書單、位置和 bitset 永遠是同一版
+    def __init__(self, docs=()):
+        self.docs = list(docs)
+        self.pos = {book["id"]: i for i, book in enumerate(self.docs)}
+        self.bits = {f: {} for f in FACET_FIELDS}
+        for i, book in enumerate(self.docs):
+            bit = 1 << i
+            for f in FACET_FIELDS:
+                values = book.get(f) or () if f == "tags" else (book.get(f),)
+                for v in values:
+                    self.bits[f][v] = self.bits[f].get(v, 0) | bit
+        self.all = (1 << len(self.docs)) - 1
+
+    def ids_mask(self, ids):
+        m = 0
+        for doc_id in ids:
+            if doc_id in self.pos:
+                m |= 1 << self.pos[doc_id]
+        return m
+
+    def mask(self, selected, exclude=None, base=None):
+        m = self.all if base is None else base
+        for f, v in selected.items():
+            if f != exclude and v is not None:
+                m &= self.bits[f].get(v, 0)
+        return m
+
+    def counts(self, facet, selected, base=None):
+        # 下拉選單的數字要反映「其他條件都套用後」還剩幾本
+        m = self.mask(selected, exclude=facet, base=base)
+        return {v: (b & m).bit_count() for v, b in self.bits[facet].items()}
+
+    def select(self, m):
+        s = bin(m)[:1:-1]
+        out = []
+        i = s.find("1")
+        while i != -1:
+            out.append(self.docs[i])
+            i = s.find("1", i + 1)
+        return out
+
+class FacetIndex:
+    def __init__(self):
+        self.state = FacetState()
+        self.version = None
+        self.lock = threading.Lock()
+
+    def sync_from(self, store):
+        # 新版本整份建好再一次換上；呼叫端整次渲染都用回傳的這一份，不會混到新舊兩版
+        version = store.version
+        if version != self.version:
+            with self.lock:
+                if version != self.version:
+                    self.state = FacetState(store.rows.values())
+                    self.version = version
+        return self.state
+
+@st.cache_resource(show_spinner=False)
+def get_facet_index():
+    return FacetIndex()
+
+# =========================
+# 1.8) 封面快取（下載一次、縮圖、從本機 static 提供）
+# =========================
+COVER_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static", "covers")
+COVER_URL_PREFIX = "app/static/covers"
+COVER_SIZES = {"grid": 300, "detail": 800}
+COVER_MAX_BYTES = 20 * 1024 * 1024
+COVER_RETRY_SECONDS = 10 * 60
+
+def cover_hash(url):
+    # Notion 上傳的封面是大約一小時就過期的簽名網址；重新簽名只會換掉 query，
+    # 所以去掉簽名參數再算 hash，同一張圖不會因為重簽而重新下載
+    parts = urlsplit(url)
+    if "X-Amz-" in parts.query or "Signature=" in parts.query:
+        url = f"{parts.scheme}://{parts.netloc}{parts.path}"
+    return hashlib.sha1(url.encode()).hexdigest()[:12]
+
+class CoverCache:
+    def __init__(self, root):
+        os.makedirs(root, exist_ok=True)
+        self.root = root
+        self.session = requests.Session()
+        self.pool = ThreadPoolExecutor(max_workers=4)
+        self.pending = set()
+        self.failed = {}
+        self.lock = threading.Lock()
+
+    def src(self, page_id, url, size="grid"):
+        if not url:
+            return ""
+        key = f"{page_id}_{cover_hash(url)}"
+        name = f"{key}_{size}.jpg"
+        if os.path.exists(os.path.join(self.root, name)):
+            return f"{COVER_URL_PREFIX}/{name}"
+        self._schedule(page_id, key, url)
+        # 縮圖還沒好之前先用原始網址
+        return url
+
+    def _schedule(self, page_id, key, url):
+        with self.lock:
+            if key in self.pending:
+                return
+            # 失敗記的是完整網址：重新簽名後的新網址不必等冷卻時間
+            failed_url, failed_at = self.failed.get(key, (None, 0))
+            if failed_url == url and time.time() - failed_at < COVER_RETRY_SECONDS:
+                return
+            self.pending.add(key)
+        self.pool.submit(self._download, page_id, key, url)
+
+    def _download(self, page_id, key, url):
+        try:
+            response = self.session.get(url, timeout=(5, 20))
+            response.raise_for_status()
+            if len(response.content) > COVER_MAX_BYTES:
+                raise ValueError("封面檔案過大")
+            image = Image.open(io.BytesIO(response.content)).convert("RGB")
+            for size, width in COVER_SIZES.items():
+                thumb = image.copy()
+                thumb.thumbnail((width, width * 3 // 2))
+                path = os.path.join(self.root, f"{key}_{size}.jpg")
+                thumb.save(path + ".tmp", "JPEG", quality=80, optimize=True)
+                os.replace(path + ".tmp", path)
+            # 同一本書換了封面（hash 不同）就把舊檔清掉
+            for old in glob.glob(os.path.join(self.root, f"{glob.escape(page_id)}_*.jpg")):
+                if not os.path.basename(old).startswith(key):
+                    os.remove(old)
+            self.failed.pop(key, None)
+        except Exception:
+            self.failed[key] = (url, time.time())
+        finally:
+            with self.lock:
+                self.pending.discard(key)
+
+@st.cache_resource(show_spinner=False)
+def get_cover_cache():
+    return CoverCache(COVER_DIR)
+
+def cover_src(book, size="grid"):
+    return get_cover_cache().src(book["id"], book.get("cover"), size)
+
+# =========================
+# 1.9) 書籍欄位表（pandas，分類欄用 category dtype，每個資料版本只建一次）
+# =========================
+class BookFrame:
+    def __init__(self):
+        self.frame = None
+        self.version = None
+        self.lock = threading.Lock()
+
+    def sync_from(self, store):
+        version = store.version
+        if version == self.version:
+            return self.frame
+        import pandas as pd
+
+        with self.lock:
+            if version != self.version:
+                books = list(store.rows.values())
+                self.frame = pd.DataFrame(
+                    {
+                        "id": [b["id"] for b in books],
+                        "title": [b["title"] for b in books],
+                        "status": pd.Categorical([b["status"] for b in books]),
+                        "category": pd.Categorical([b["category"] for b in books]),
+                        "genre": pd.Categorical([b["genre"] for b in books]),
+                        "pages": pd.array([b["pages"] for b in books], dtype="Int64"),
+                        "year": pd.array([b["year"] for b in books], dtype="Int64"),
+                        "start_date": pd.to_datetime([b["start_date"] for b in books]),
+                        "end_date": pd.to_datetime([b["end_date"] for b in books]),
+                    }
+                )
+                self.version = version
+        return self.frame
+
+@st.cache_resource(show_spinner=False)
+def get_book_frame():
+    return BookFrame()
+
+def books_frame():
+    return get_book_frame().sync_from(get_delta_sync("books"))
+
+# =========================
+# 1.10) 閱讀統計彙總（每日 / 每月頁數與分鐘數，隨同步增量更新）
+# =========================
+HEATMAP_YEARS = 3
+HEATMAP_WEEKDAYS = ["日", "一", "二", "三", "四", "五", "六"]
+
+def month_keys(end, n):
+    keys = []
+    y, m = end.year, end.month
+    for _ in range(n):
+        keys.append(f"{y}-{m:02d}")
+        m -= 1
+        if m == 0:
+            y, m = y - 1, 12
+    return keys[::-1]
+
+class ReadingRollup:
+    def __init__(self):
+        self.daily = {}
+        self.monthly = {}
+        self.contrib = {}
+        self.version = None
+        self.frame = None
+        self.frame_key = None
+        self.lock = threading.Lock()
+
+    def _bump(self, contrib, sign):
+        day, pages, mins = contrib
+        for table, key in ((self.daily, day), (self.monthly, day[:7])):
+            cell = table.setdefault(key, [0, 0])
+            cell[0] += sign * pages
+            cell[1] += sign * mins
+
+    def sync_from(self, store):
+        version = store.version
+        if version == self.version:
+            return self
+        with self.lock:
+            if version == self.version:
+                return self
+            rows = store.rows
+            for log_id in [i for i in self.contrib if i not in rows]:
+                self._bump(self.contrib.pop(log_id), -1)
+            for log_id, log in rows.items():
+                contrib = ((log.get("date") or "")[:10], log.get("pages") or 0, log.get("mins") or 0)
+                old = self.contrib.get(log_id)
+                if old != contrib:
+                    if old:
+                        self._bump(old, -1)
+                    self._bump(contrib, 1)
+                    self.contrib[log_id] = contrib
+            self.version = version
+        return self
+
+    def days(self, end, n):
+        with self.lock:
+            return [(d, *self.daily.get(d.isoformat(), (0, 0))) for d in (end - timedelta(days=i) for i in range(n - 1, -1, -1))]
+
+    def months(self, end, n):
+        with self.lock:
+            return [(k, *self.monthly.get(k, (0, 0))) for k in month_keys(end, n)]
+
+    def heatmap(self, first_year, last_year):
+        # 每天一格（沒讀也要有格子），同一個資料版本只算一次
+        key = (self.version, first_year, last_year)
+        if self.frame_key != key:
+            import pandas as pd
+
+            start, end = date(first_year, 1, 1), date(last_year, 12, 31)
+            days = self.days(end, (end - start).days + 1)
+            offsets = {y: (date(y, 1, 1).weekday() + 1) % 7 for y in range(first_year, last_year + 1)}
+            self.frame = pd.DataFrame(
+                {
+                    "日期": [d.isoformat() for d, _, _ in days],
+                    "年": [d.year for d, _, _ in days],
+                    "週": [(d.timetuple().tm_yday - 1 + offsets[d.year]) // 7 for d, _, _ in days],
+                    "星期": [HEATMAP_WEEKDAYS[(d.weekday() + 1) % 7] for d, _, _ in days],
+                    "頁數": [int(p) for _, p, _ in days],
+                    "分鐘": [int(m) for _, _, m in days],
+                }
+            )
+            self.frame_key = key
+        return self.frame
+
+@st.cache_resource(show_spinner=False)
+def get_reading_rollup():
+    return ReadingRollup()
+
+def reading_rollup():
+    return get_reading_rollup().sync_from(get_delta_sync("logs"))
+
+# =========================
+# 1.11) 行事曆月份快取（只查當月的紀錄與待辦，前後月預先載入）
+# =========================
+CALENDAR_MONTH_TTL = 60
+CALENDAR_PREFETCH = 1  # 前後各預載幾個月
+
+def month_bounds(year, month):
+    first = date(year, month, 1)
+    last = date(year, month, calendar.monthrange(year, month)[1])
+    return first.isoformat(), last.isoformat()
+
+def shift_month(year, month, delta):
+    y, m = divmod(year * 12 + month - 1 + delta, 12)
+    return y, m + 1
+
+def date_range_filter(prop, first, last):
+    return [
+        {"property": prop, "date": {"on_or_after": first}},
+        {"property": prop, "date": {"on_or_before": last}},
+    ]
+
+def query_month(year, month):
+    first, last = month_bounds(year, month)
+    logs, todos = {}, {}
+    if LOG_DS_ID:
+        body = {"filter": {"and": date_range_filter(LOG_DATE, first, last)}}
+        logs = {log["id"]: log for log in iter_parsed("logs", LOG_DS_ID, parse_logs, body)}
+    if TODO_DS_ID:
+        body = {"filter": {"and": date_range_filter(TODO_DUE, first, last) + [{"property": TODO_DONE, "checkbox": {"equals": False}}]}}
+        todos = {task["id"]: task for task in iter_parsed("todos", TODO_DS_ID, parse_todos, body)}
+    return {"at": time.time(), "logs": logs, "todos": todos}
+
+def build_day_map(logs, todos):
+    log_map = {}
+    for log in logs:
+        d = (log["date"] or "")[:10]
+        if d:
+            if d not in log_map:
+                log_map[d] = {"pages": 0, "mins": 0, "todos": []}
+            log_map[d]["pages"] += log["pages"]
+            log_map[d]["mins"] += log["mins"]
+
+    for task in todos:
+        d = (task["due_date"] or "")[:10]
+        if d and not task["done"]:
+            if d not in log_map:
+                log_map[d] = {"pages": 0, "mins": 0, "todos": []}
+            log_map[d]["todos"].append(task["name"])
+    return log_map
+
+class MonthCache:
+    def __init__(self, ttl, cache):
+        self.ttl = ttl
+        self.cache = cache  # 月份資料放在共用的結果快取裡，跟著總容量一起淘汰
+        self.pending = {}
+        self.pool = ThreadPoolExecutor(max_workers=2)
+        self.lock = threading.Lock()
+
+    def _load(self, key):
+        try:
+            entry = query_month(*key)
+            with self.lock:
+                self.cache.put("calendar_month", key, entry)
+            return entry
+        finally:
+            with self.lock:
+                self.pending.pop(key, None)
+
+    def _submit(self, key):
+        # 同一個月同時只會有一個查詢在路上
+        future = self.pending.get(key)
+        if future is None:
+            future = self.pool.submit(self._load, key)
+            self.pending[key] = future
+        return future
+
+    def get(self, year, month):
+        key = (year, month)
+        with self.lock:
+            entry = self.cache.get("calendar_month", key)
+            future = None
+            result = "hit"
+            if entry is None:
+                result = "miss"
+                future = self._submit(key)
+            elif time.time() - entry["at"] > self.ttl:
+                # 過期的先照用，背景重抓
+                result = "stale"
+                self._submit(key)
+            for delta in range(1, CALENDAR_PREFETCH + 1):
+                for near in (shift_month(year, month, -delta), shift_month(year, month, delta)):
+                    if not self.cache.contains("calendar_month", near):
+                        self._submit(near)
+        get_metrics().incr("cache_requests_total", cache="calendar_month", result=result)
+        if future is not None:
+            entry = future.result()
+        with self.lock:
+            return build_day_map(list(entry["logs"].values()), list(entry["todos"].values()))
+
+    def apply(self, dataset, pages, rows):
+        if dataset not in ("logs", "todos"):
+            return
+        field = "date" if dataset == "logs" else "due_date"
+        with self.lock:
+            entries = dict(self.cache.items("calendar_month"))
+            changed = set()
+            for page, row in zip(pages, rows):
+                for key, entry in entries.items():
+                    if entry[dataset].pop(page["id"], None) is not None:
+                        changed.add(key)
+                day = row and row[field]
+                if not day or (dataset == "todos" and row["done"]):
+                    continue
+                key = (int(day[:4]), int(day[5:7]))
+                if key in entries:
+                    entries[key][dataset][page["id"]] = row
+                    changed.add(key)
+            # 重新放回去，大小才會重算
+            for key in changed:
+                self.cache.put("calendar_month", key, entries[key])
+
+@st.cache_resource(show_spinner=False)
+def get_month_cache():
+    return MonthCache(CALENDAR_MONTH_TTL, get_result_cache())
+
+def calendar_month(year, month):
+    if DEMO_MODE:
+        demo = load_snapshot(("logs", "todos"))
+        return build_day_map(demo.logs, demo.todos)
+    try:
+        return get_month_cache().get(year, month)
+    except Exception:
+        # 查詢失敗時退回別的頁面已經載入的全量資料，只挑這個月；不為了這個把整份紀錄排進同步
+        prefix = f"{year}-{month:02d}"
+        logs = [log for log in snapshot.logs if (log["date"] or "").startswith(prefix)]
+        todos = [t for t in snapshot.todos if (t["due_date"] or "").startswith(prefix)]
+        return build_day_map(logs, todos)
+
+# =========================
+# 1.12) 書庫查詢下推（篩選、排序轉成 Notion filter / sorts，每種組合各快取一份）
+# =========================
+LIBRARY_QUERY_TTL = 60
+LIBRARY_SORTS = {
+    "排序：預設": None,
+    "書名 A→Z": ("title", PROP_TITLE, "ascending"),
+    "出版年 新→舊": ("year", PROP_YEAR, "descending"),
+    "頁數 多→少": ("pages", PROP_PAGES, "descending"),
+    "最近新增": ("created_time", None, "descending"),
+}
+
+def library_query(selected, q=None, sort=None, prop_types=None):
+    prop_types = prop_types or {}
+    clauses = []
+    for f, v in selected.items():
+        if v is None:
+            continue
+        prop = BOOK_PROPS[f]
+        kind = prop_types.get(prop) or ("multi_select" if f == "tags" else "select")
+        if v == "未分類" and kind != "multi_select":
+            clauses.append({"property": prop, kind: {"is_empty": True}})
+        else:
+            clauses.append({"property": prop, kind: {"contains" if kind == "multi_select" else "equals": v}})
+    if q:
+        clauses.append(
+            {
+                "or": [
+                    {"property": PROP_TITLE, "title": {"contains": q}},
+                    {"property": PROP_AUTHOR, "rich_text": {"contains": q}},
+                ]
+            }
+        )
+    body = {}
+    if clauses:
+        body["filter"] = clauses[0] if len(clauses) == 1 else {"and": clauses}
+    if LIBRARY_SORTS.get(sort):
+        _, prop, direction = LIBRARY_SORTS[sort]
+        body["sorts"] = [{"timestamp": "created_time", "direction": direction} if prop is None else {"property": prop, "direction": direction}]
+    return body
+
+def sort_books(books_list, sort, created):
+    if not LIBRARY_SORTS.get(sort):
+        return books_list
+    field, _, direction = LIBRARY_SORTS[sort]
+    if field == "created_time":
+        value = lambda b: created.get(b["id"])
+    else:
+        value = lambda b: b.get(field)
+    # 沒有值的一律排在最後
+    present = [b for b in books_list if value(b) not in (None, "")]
+    missing = [b for b in books_list if value(b) in (None, "")]
+    return sorted(present, key=value, reverse=direction == "descending") + missing
+
+def query_library(selected, q=None, sort=None):
+    try:
+        prop_types = fetch_property_types(BOOK_DS_ID)
+    except Exception:
+        prop_types = {}
+    body = library_query(selected, q, sort, prop_types)
+    key = json.dumps(body, sort_keys=True, ensure_ascii=False)
+    # 書籍寫入時整個命名空間會被清掉，其他地方的修改最多晚一個 TTL 看到
+    cache = get_result_cache()
+    entry = cache.get("library_query", key)
+    if entry and time.time() - entry[0] <= LIBRARY_QUERY_TTL:
+        get_metrics().incr("cache_requests_total", cache="library_query", result="hit")
+        return entry[1]
+    get_metrics().incr("cache_requests_total", cache="library_query", result="miss")
+    result = list(iter_parsed("books", BOOK_DS_ID, parse_books, body))
+    cache.put("library_query", key, (time.time(), result))
+    return result
+
+def book_choices():
+    # 計時、行事曆選書用；notion 模式不同步整份書單，只向 Notion 要閱讀中的書
+    if not LIBRARY_PUSHDOWN:
+        return books
+    try:
+        return query_library({"status": "閱讀中"}, sort="書名 A→Z")
+    except Exception:
+        return []
+
 # =========================
 # 2) CSS 樣式 (RWD 增強版)
 # =========================
@@ -486,6 +2434,8 @@ section[data-testid="stSidebar"] { top: 64px !important; height: calc(100vh - 64
 .cal-grid { display: grid; grid-template-columns: repeat(7, 1fr); gap: 8px; margin-top: 10px; }
 .cal-cell { min-height: 100px; height: auto; border: 1px solid #e2e8f0; border-radius: 8px; padding: 8px; display: flex; flex-direction: column; justify-content: flex-start; background: #fff; transition: 0.2s; overflow: visible; }
 .cal-cell.today { border: 2px solid var(--purple); background: #fbf7ff; }
+.cal-cell.empty { border: none; background: transparent; }
+.cal-head { text-align: center; color: #64748b; font-weight: bold; }
 .reading-block { background-color: var(--green); color: white; border-radius: 6px; padding: 4px; font-size: 12px; font-weight: 700; text-align: center; margin-top: 2px; box-shadow: 0 1px 2px rgba(0,0,0,0.1); width: 100%; }
 .todo-block { background-color: var(--orange); color: white; border-radius: 6px; padding: 4px; font-size: 11px; font-weight: 600; text-align: left; margin-top: 2px; box-shadow: 0 1px 2px rgba(0,0,0,0.1); width: 100%; overflow: hidden; white-space: nowrap; text-overflow: ellipsis; }
 .stat-box { background: #1e293b; color: white; border-radius: 12px; padding: 20px; margin-bottom: 15px; text-align: center; }
@@ -549,17 +2499,55 @@ def render_sidebar():
         if st.button("✅ 待辦清單", width="stretch"):
             st.session_state.page = "todo"
             st.rerun()
+        if st.button("📥 批次匯入", width="stretch"):
+            st.session_state.page = "import"
+            st.rerun()
         st.divider()
         if error_message:
             st.error("連線異常")
         else:
             st.success("✅ Notion 已連線")
+        if DEMO_MODE:
+            return
+        age = f"{format_age(snapshot.age)}的資料" if snapshot.age is not None else "上次的資料"
+        if refreshing():
+            st.caption(f"🔄 背景更新中，目前顯示 {age}")
+        elif refresh_failed():
+            st.caption(f"⚠️ 更新失敗，目前顯示 {age}")
+        elif snapshot.age is not None:
+            st.caption(f"🕒 資料更新於 {format_age(snapshot.age)}")
+
+def render_metrics_panel():
+    if not st.session_state.get("is_admin", not os.getenv("ADMIN_PASSWORD")):
+        return
+    metrics = get_metrics()
+    with st.sidebar.expander("📈 效能監控"):
+        timers = metrics.timers()
+        if timers:
+            # 用 markdown 表格：st.dataframe 會把 pandas 拉進每一頁
+            lines = ["| 指標 | 標籤 | 次數 | p50 | p95 | p99 |", "|---|---|---:|---:|---:|---:|"]
+            for t in timers:
+                fmt = (lambda v: f"{v * 1000:.1f} ms") if t["name"].endswith("_seconds") else (lambda v: f"{v:g}")
+                cells = [t["name"], ",".join(map(str, t["labels"].values())), t["count"]] + [fmt(t["quantiles"][q]) for q in (0.5, 0.95, 0.99)]
+                lines.append("| " + " | ".join(map(str, cells)) + " |")
+            st.markdown("\n".join(lines))
+        rates = metrics.hit_rates()
+        if rates:
+            st.caption("快取命中率：" + "、".join(f"{name} {rate:.0%}" for name, rate in rates.items()))
+        usage = get_result_cache().stats()
+        st.caption(
+            f"結果快取 {usage['bytes'] / 1048576:.1f} / {usage['budget'] / 1048576:.0f} MB，{usage['entries']} 筆，淘汰 {usage['evictions']} 次"
+        )
+        limited = sum(c["value"] for c in metrics.counter_items() if c["labels"].get("status") == "429")
+        st.caption(f"Notion 請求 {metrics.count('notion_request_seconds')} 次，429 共 {limited} 次")
+        st.download_button("⬇️ Prometheus 格式", metrics.prometheus(), file_name="metrics.txt", mime="text/plain", width="stretch")
 
 # =========================
 # 4) 功能頁面
 # =========================
 @st.dialog("📖 新增書籍")
 def entry_form():
+    st.session_state.dialog_open = True
     with st.form("add"):
         c1, c2 = st.columns(2)
         title = c1.text_input("書名 (必填)", placeholder="請輸入書名")
@@ -595,9 +2583,8 @@ def entry_form():
                     "end_date": end_date,
                 }
                 if add_book_to_notion(data):
-                    st.success("新增成功")
-                    time.sleep(1)
-                    refresh_data()
+                    st.toast("新增成功", icon="✅")
+                    st.rerun()
 
 def render_todo():
     render_topbar("待辦清單")
@@ -629,7 +2616,7 @@ def render_todo():
                         st.error(f"失敗: {msg}")
 
     st.write("")
-    todos = fetch_todos()
+    todos = snapshot.todos
     pending = [t for t in todos if not t["done"]]
     completed = [t for t in todos if t["done"]]
     c1, c2 = st.columns([1, 1], gap="large")
@@ -653,51 +2640,135 @@ def render_todo():
             for task in completed:
                 st.markdown(f'<div class="todo-item todo-done">{task["name"]}</div>', unsafe_allow_html=True)
 
+def render_import():
+    render_topbar("批次匯入")
+    if DEMO_MODE:
+        st.warning("未設定 Notion 連線，無法匯入")
+        return
+
+    kind_label = st.radio("匯入類型", ["閱讀紀錄", "書籍"], horizontal=True)
+    kind = "logs" if kind_label == "閱讀紀錄" else "books"
+    if kind == "logs" and not LOG_DS_ID:
+        st.error("請檢查 .env 設定")
+        return
+    cols = "、".join(names[0] for names in IMPORT_COLUMNS[kind].values())
+    st.caption(f"支援 CSV / JSON / JSON Lines，欄位：{cols}（也可用 Notion 中文欄位名稱）。同一個檔案重新匯入會從中斷處繼續。")
+
+    upload = st.file_uploader("選擇檔案", type=["csv", "json", "jsonl"])
+    if upload and st.button("開始匯入", type="primary"):
+        bar = st.progress(0.0)
+
+        def on_progress(done, total):
+            bar.progress(done / total if total else 1.0, text=f"{done} / {total}")
+
+        st.session_state.import_result = run_import(kind, upload, upload.name, books, on_progress)
+
+    result = st.session_state.get("import_result")
+    if result:
+        m1, m2, m3 = st.columns(3)
+        m1.metric("成功匯入", result["imported"])
+        m2.metric("先前已匯入", result["skipped"])
+        m3.metric("失敗", len(result["failed"]))
+        if result["failed"]:
+            st.download_button(
+                "下載失敗報告 (CSV)",
+                import_report_csv(result["failed"]),
+                file_name=f"import_failed_{result['job'].replace(':', '_')}.csv",
+                mime="text/csv",
+            )
+
+TIMER_MODES = {"25 分鐘 (專注)": 25, "5 分鐘 (短休)": 5, "15 分鐘 (長休)": 15, "自訂": None}
+
+def timer_countdown_html(remaining, total):
+    # 倒數在瀏覽器端跑，伺服器在計時期間不用做任何事
+    return f"""
+<div id="t" style="font-size:90px; font-weight:900; color:#6f2dbd; font-family:'Courier New', monospace; text-align:center; letter-spacing:-2px;"></div>
+<div style="height:8px; background:#ede9fe; border-radius:4px; overflow:hidden;"><div id="p" style="height:100%; width:0; background:#6f2dbd;"></div></div>
+<script>
+const end = Date.now() + {remaining * 1000:.0f}, total = {total};
+function tick() {{
+    const s = Math.max(0, Math.ceil((end - Date.now()) / 1000));
+    document.getElementById("t").textContent = String(Math.floor(s / 60)).padStart(2, "0") + ":" + String(s % 60).padStart(2, "0");
+    document.getElementById("p").style.width = (100 * (total - s) / total) + "%";
+    if (s > 0) setTimeout(tick, 250);
+}}
+tick();
+</script>
+"""
+
+def finish_timer():
+    ss = st.session_state
+    deadline = ss.get("timer_deadline")
+    if not deadline or time.time() < deadline:
+        return False
+    ss.timer_deadline = None
+    ss.timer_finished = ss.timer_total // 60
+    ss.timer_logged = None
+    if ss.get("timer_book"):
+        ss.timer_logged = add_log_to_notion(datetime.now(ZoneInfo("Asia/Taipei")).date(), ss.timer_book, 0, ss.timer_total // 60)
+    return True
+
+def watch_timer():
+    # 只在截止時間醒來一次
+    if finish_timer():
+        st.rerun()
+
 def render_timer():
     render_topbar("專注計時")
     st.markdown(
         """<style>div[data-testid="stVerticalBlock"]:has(div#timer-target) {background-color: white; border-radius: 24px; padding: 30px; box-shadow: 0 10px 30px rgba(0,0,0,0.05); border: 1px solid #e2e8f0; text-align: center;}</style>""",
         unsafe_allow_html=True,
     )
+    ss = st.session_state
+    deadline = ss.get("timer_deadline")
     c1, c2, c3 = st.columns([1, 2, 1])
     with c2:
         with st.container():
             st.markdown('<div id="timer-target"></div>', unsafe_allow_html=True)
             st.markdown('<div class="timer-label">FOCUS TIMER</div>', unsafe_allow_html=True)
-            t_mode = st.radio("選擇模式", ["25 分鐘 (專注)", "5 分鐘 (短休)", "15 分鐘 (長休)", "自訂"], horizontal=True, label_visibility="collapsed")
-            total_mins = 25
-            if "5 分鐘" in t_mode:
-                total_mins = 5
-            elif "15 分鐘" in t_mode:
-                total_mins = 15
-            elif "自訂" in t_mode:
-                total_mins = st.number_input("設定分鐘數", min_value=1, max_value=120, value=25)
-
-            total_secs = total_mins * 60
-            if st.button("▶ 開始計時", type="primary", width="stretch"):
-                progress_bar = st.progress(0)
-                status_text = st.empty()
-                timer_text = st.empty()
-                for i in range(total_secs, -1, -1):
-                    mins, secs = divmod(i, 60)
-                    time_str = f"{mins:02d}:{secs:02d}"
-                    timer_text.markdown(f'<div class="timer-display">{time_str}</div>', unsafe_allow_html=True)
-                    progress = (total_secs - i) / total_secs if total_secs else 1
-                    progress_bar.progress(progress)
-                    status_text.caption("⏳ 專注中...請勿關閉視窗")
-                    time.sleep(1)
-                status_text.success("✅ 時間到！休息一下吧！")
+            if deadline:
+                remaining = max(deadline - time.time(), 0)
+                st.iframe(timer_countdown_html(remaining, ss.timer_total), height=150)
+                st.caption("⏳ 專注中...可以切換頁面，時間到會自動結束")
+                st.fragment(watch_timer, run_every=max(remaining, 1))()
+                if st.button("⏹ 停止計時", width="stretch"):
+                    ss.timer_deadline = None
+                    st.rerun()
+                return
+
+            t_mode = st.radio("選擇模式", list(TIMER_MODES), horizontal=True, label_visibility="collapsed")
+            total_mins = TIMER_MODES[t_mode] or st.number_input("設定分鐘數", min_value=1, max_value=120, value=25)
+            book_opts = {"（不記錄）": None} | {b["title"]: b["id"] for b in book_choices()}
+            sel_book = st.selectbox("結束後記錄到書籍", list(book_opts))
+
+            if ss.get("timer_finished"):
+                if ss.get("timer_logged"):
+                    st.success(f"✅ 時間到！已記錄 {ss.timer_finished} 分鐘閱讀")
+                elif ss.get("timer_logged") is False:
+                    st.warning(f"✅ 時間到！但 {ss.timer_finished} 分鐘的紀錄寫入失敗")
+                else:
+                    st.success("✅ 時間到！休息一下吧！")
                 st.balloons()
-            else:
-                st.markdown(f'<div class="timer-display">{total_mins:02d}:00</div>', unsafe_allow_html=True)
+                ss.timer_finished = None
+
+            st.markdown(f'<div class="timer-display">{total_mins:02d}:00</div>', unsafe_allow_html=True)
+            if st.button("▶ 開始計時", type="primary", width="stretch"):
+                ss.timer_total = total_mins * 60
+                ss.timer_deadline = time.time() + ss.timer_total
+                ss.timer_book = book_opts[sel_book]
+                st.rerun()
 
 def render_dashboard():
+    # pandas / altair 只有畫圖的頁面才載入，計時、待辦這些輕量頁面不必付這筆啟動成本
+    import pandas as pd
+    import altair as alt
+
     render_topbar("儀表板")
     if error_message:
         st.error(f"⚠️ {error_message}")
         return
 
-    todos = fetch_todos()
+    todos = snapshot.todos
     pending_count = len([t for t in todos if not t["done"]])
     reading = sum(1 for b in books if b["status"] == "閱讀中")
 
@@ -732,42 +2803,23 @@ def render_dashboard():
         )
 
     st.write("")
-    logs = fetch_logs()
 
-    if books:
-        df_cat = pd.DataFrame([b["category"] for b in books], columns=["分類"])
-        df_cat_count = df_cat["分類"].value_counts().reset_index()
+    frame = books_frame()
+    if not frame.empty:
+        df_cat_count = frame["category"].value_counts(sort=True).reset_index()
         df_cat_count.columns = ["分類", "數量"]
+        df_cat_count = df_cat_count[df_cat_count["數量"] > 0]
     else:
         df_cat_count = pd.DataFrame(columns=["分類", "數量"])
 
-    if logs:
-        df_logs = pd.DataFrame(logs)
-        df_logs["date_obj"] = pd.to_datetime(df_logs["date"]).dt.date
-
+    # 圖表只讀需要的視窗（7 天、6 個月），不再每次 rerun 把全部紀錄 groupby 一次
+    rollup = reading_rollup()
+    if rollup.contrib:
         today_val = date.today()
-        date_list = [today_val - timedelta(days=i) for i in range(6, -1, -1)]
-        df_recent_base = pd.DataFrame({"date_obj": date_list})
-        df_daily_sum = df_logs.groupby("date_obj")["pages"].sum().reset_index()
-        df_recent = pd.merge(df_recent_base, df_daily_sum, on="date_obj", how="left").fillna(0)
-        df_recent["日期"] = df_recent["date_obj"].apply(lambda x: x.strftime("%m/%d"))
-        df_recent["頁數"] = df_recent["pages"].astype(int)
-
-        month_list = []
-        for i in range(6):
-            y = today_val.year
-            m = today_val.month - i
-            while m <= 0:
-                m += 12
-                y -= 1
-            month_list.append(f"{y}-{m:02d}")
-        month_list.reverse()
-
-        df_monthly_base = pd.DataFrame({"月份": month_list})
-        df_logs["月份"] = pd.to_datetime(df_logs["date_obj"]).dt.strftime("%Y-%m")
-        df_monthly_sum = df_logs.groupby("月份")["pages"].sum().reset_index()
-        df_monthly_sum.columns = ["月份", "總頁數"]
-        df_monthly = pd.merge(df_monthly_base, df_monthly_sum, on="月份", how="left").fillna(0)
+        recent = rollup.days(today_val, 7)
+        df_recent = pd.DataFrame({"日期": [d.strftime("%m/%d") for d, _, _ in recent], "頁數": [int(p) for _, p, _ in recent]})
+        monthly = rollup.months(today_val, 6)
+        df_monthly = pd.DataFrame({"月份": [k for k, _, _ in monthly], "總頁數": [p for _, p, _ in monthly]})
     else:
         df_recent = pd.DataFrame(columns=["日期", "頁數"])
         df_monthly = pd.DataFrame(columns=["月份", "總頁數"])
@@ -818,6 +2870,9 @@ def render_dashboard():
         st.altair_chart(area.properties(height=300), width="stretch")
     st.markdown("</div>", unsafe_allow_html=True)
 
+LIBRARY_COLS = 5
+LIBRARY_PAGE_SIZE = 20
+
 def render_library():
     render_topbar("書庫列表")
     if error_message:
@@ -826,50 +2881,92 @@ def render_library():
 
     c1, c2 = st.columns([6, 1.2])
     with c1:
-        st.markdown(f"### 📚 我的書櫃 ({len(books)})")
+        # notion 模式下本機沒有整份書單，書數等查詢結果回來再填
+        heading = st.empty()
     with c2:
         if st.button("＋ 新增書籍", type="primary", width="stretch"):
             entry_form()
 
+    pushdown = LIBRARY_PUSHDOWN
+    if not pushdown:
+        store = get_delta_sync("books")
+        facets = get_facet_index().sync_from(store)
+        heading.markdown(f"### 📚 我的書櫃 ({len(books)})")
+    facet_opts = {"status": opt_status, "category": opt_cat, "genre": opt_gen, "tags": opt_tag}
+    choices = {f"lib_{f}": [f"{label}: 全部"] + (facet_opts[f] if facet_opts[f] else []) for f, label in FACET_FIELDS.items()}
+    choices["lib_sort"] = list(LIBRARY_SORTS)
+    # 書籍詳情頁不會畫這些元件，Streamlit 會把它們的狀態丟掉；回到書庫時從另存的一份放回去
+    for key, value in st.session_state.get("lib_view", {}).items():
+        if key not in st.session_state and (key not in choices or value in choices[key]):
+            st.session_state[key] = value
+    # 下拉選單還沒畫出來前先從 session_state 取目前的選擇，才能算出其他選單的數量
+    selected = {}
+    for f, label in FACET_FIELDS.items():
+        v = st.session_state.get(f"lib_{f}")
+        selected[f] = None if v in (None, f"{label}: 全部") else v
+
     with st.container():
         st.markdown('<div class="filter-container">', unsafe_allow_html=True)
-        f1, f2, f3, f4, f5 = st.columns([2, 0.8, 0.8, 0.8, 0.8], gap="small")
+        f1, *facet_cols, f_sort = st.columns([2, 0.8, 0.8, 0.8, 0.8, 0.9], gap="small")
         with f1:
-            q = st.text_input("搜尋", placeholder="書名...", label_visibility="collapsed")
-        with f2:
-            f_status = st.selectbox("狀態", ["狀態: 全部"] + (opt_status if opt_status else []), label_visibility="collapsed")
-        with f3:
-            f_cat = st.selectbox("分類", ["分類: 全部"] + (opt_cat if opt_cat else []), label_visibility="collapsed")
-        with f4:
-            f_genre = st.selectbox("類別", ["類別: 全部"] + (opt_gen if opt_gen else []), label_visibility="collapsed")
-        with f5:
-            f_tag = st.selectbox("標籤", ["標籤: 全部"] + (opt_tag if opt_tag else []), label_visibility="collapsed")
+            q = st.text_input("搜尋", placeholder="書名、作者、出版社、標籤、簡介...", key="lib_q", label_visibility="collapsed")
+        ranked = search_books(q) if q and not pushdown else None
+        base = facets.ids_mask(ranked) if ranked is not None else None
+        for col, (f, label) in zip(facet_cols, FACET_FIELDS.items()):
+            counts = None if pushdown else facets.counts(f, selected, base)
+            all_label = f"{label}: 全部"
+            with col:
+                st.selectbox(
+                    label,
+                    choices[f"lib_{f}"],
+                    key=f"lib_{f}",
+                    label_visibility="collapsed",
+                    format_func=lambda v, counts=counts, all_label=all_label: v if v == all_label or counts is None else f"{v} ({counts.get(v, 0)})",
+                )
+        with f_sort:
+            sort = st.selectbox("排序", choices["lib_sort"], key="lib_sort", label_visibility="collapsed")
         st.markdown("</div>", unsafe_allow_html=True)
-
-    filtered = books
-    if q:
-        filtered = [b for b in filtered if q.lower() in b["title"].lower()]
-    if f_status != "狀態: 全部":
-        filtered = [b for b in filtered if b["status"] == f_status]
-    if f_cat != "分類: 全部":
-        filtered = [b for b in filtered if b["category"] == f_cat]
-    if f_genre != "類別: 全部":
-        filtered = [b for b in filtered if b["genre"] == f_genre]
-    if f_tag != "標籤: 全部":
-        filtered = [b for b in filtered if f_tag in b["tags"]]
+    st.session_state.lib_view = {key: st.session_state[key] for key in ("lib_q", *choices)}
+
+    if pushdown:
+        try:
+            filtered = query_library(selected, q, sort)
+        except Exception as e:
+            st.error(f"⚠️ {e}")
+            return
+        heading.markdown(f"### 📚 我的書櫃 ({len(filtered)})")
+    else:
+        m = facets.mask(selected, base=base)
+        if ranked is not None:
+            filtered = [facets.docs[facets.pos[i]] for i in ranked if i in facets.pos and m >> facets.pos[i] & 1]
+        else:
+            filtered = facets.select(m)
+        filtered = sort_books(filtered, sort, store.created)
 
     if not filtered:
         st.info("🔍 無書籍")
         return
 
-    cols = 5
-    rows = [filtered[i : i + cols] for i in range(0, len(filtered), cols)]
+    # 只畫目前這一頁；篩選條件改變才回到第一頁，從書籍詳情返回時保留原本的頁碼
+    filter_sig = (q, tuple(selected.values()), sort)
+    if st.session_state.get("lib_filter_sig") != filter_sig:
+        st.session_state.lib_filter_sig = filter_sig
+        st.session_state.lib_page = 0
+    total_pages = (len(filtered) - 1) // LIBRARY_PAGE_SIZE + 1
+    page = min(st.session_state.get("lib_page", 0), total_pages - 1)
+    window = filtered[page * LIBRARY_PAGE_SIZE : (page + 1) * LIBRARY_PAGE_SIZE]
+
+    cols = LIBRARY_COLS
+    rows = [window[i : i + cols] for i in range(0, len(window), cols)]
     for row in rows:
         cc = st.columns(cols)
         for idx, book in enumerate(row):
             with cc[idx]:
                 if book.get("cover"):
-                    st.markdown(f'<div class="book-img-container"><img src="{book["cover"]}"></div>', unsafe_allow_html=True)
+                    st.markdown(
+                        f'<div class="book-img-container"><img src="{cover_src(book)}" loading="lazy" decoding="async"></div>',
+                        unsafe_allow_html=True,
+                    )
                 else:
                     st.markdown('<div class="book-img-container"><div style="text-align:center; padding-top:40px;">📖</div></div>', unsafe_allow_html=True)
                 st.markdown('<div class="book-btn">', unsafe_allow_html=True)
@@ -880,6 +2977,23 @@ def render_library():
                     st.rerun()
                 st.markdown("</div>", unsafe_allow_html=True)
 
+    if total_pages > 1:
+        st.write("")
+        p1, p2, p3 = st.columns([1, 2, 1])
+        with p1:
+            if st.button("← 上一頁", key="lib_prev", disabled=page == 0, width="stretch"):
+                st.session_state.lib_page = page - 1
+                st.rerun()
+        with p2:
+            st.markdown(
+                f"<div style='text-align:center; color:#64748b; padding-top:8px;'>第 {page + 1} / {total_pages} 頁 · 共 {len(filtered)} 本</div>",
+                unsafe_allow_html=True,
+            )
+        with p3:
+            if st.button("下一頁 →", key="lib_next", disabled=page >= total_pages - 1, width="stretch"):
+                st.session_state.lib_page = page + 1
+                st.rerun()
+
 def render_book_detail():
     book = st.session_state.get("selected_book")
     if not book:
@@ -891,13 +3005,24 @@ def render_book_detail():
     if st.button("← 返回書庫", width="content"):
         st.session_state.page = "library"
         st.rerun()
+    if not DEMO_MODE and st.button("🔄 重新載入此書", width="content"):
+        try:
+            fresh = invalidate("books", book["id"])
+        except Exception as e:
+            st.error(f"連線失敗: {str(e)}")
+        else:
+            if fresh:
+                st.session_state.selected_book = fresh
+            else:
+                st.session_state.page = "library"
+            st.rerun()
 
     st.write("")
     c1, c2 = st.columns([1, 2], gap="large")
     with c1:
         if book.get("cover"):
             st.markdown(
-                f'<div class="detail-cover"><img src="{book["cover"]}" style="width:100%; border-radius:12px; box-shadow:0 4px 12px rgba(0,0,0,0.1);"></div>',
+                f'<div class="detail-cover"><img src="{cover_src(book, "detail")}" style="width:100%; border-radius:12px; box-shadow:0 4px 12px rgba(0,0,0,0.1);"></div>',
                 unsafe_allow_html=True,
             )
         else:
@@ -940,31 +3065,54 @@ def render_book_detail():
         else:
             st.info("暫無簡介")
 
+def render_month_grid(year, month, log_map):
+    # 整個月拼成一段 HTML，一次 st.markdown 送出
+    t_s = datetime.now().strftime("%Y-%m-%d")
+    cells = [f"<div class='cal-head'>{d}</div>" for d in HEATMAP_WEEKDAYS]
+    for week in calendar.Calendar(firstweekday=6).monthdayscalendar(year, month):
+        for day in week:
+            if day == 0:
+                cells.append("<div class='cal-cell empty'></div>")
+                continue
+            d_str = date(year, month, day).strftime("%Y-%m-%d")
+            is_today = "today" if d_str == t_s else ""
+            content_html = f"<div class='cal-date-num'>{day}</div>"
+            if d_str in log_map:
+                data = log_map[d_str]
+                if data["pages"] > 0:
+                    content_html += f"<div class='reading-block'>{data['pages']} <span>頁</span></div>"
+                for t in data["todos"][:2]:
+                    content_html += f"<div class='todo-block'>📝 {html.escape(t)}</div>"
+            cells.append(f"<div class='cal-cell {is_today}'>{content_html}</div>")
+    st.markdown(f"<div class='cal-grid'>{''.join(cells)}</div>", unsafe_allow_html=True)
+
+def render_heatmap(last_year):
+    import altair as alt
+
+    # 熱圖要整份紀錄，分頁被打開時才把 logs 排進背景同步
+    load_snapshot(("logs",))
+    df_heat = reading_rollup().heatmap(last_year - HEATMAP_YEARS + 1, last_year)
+    top = max(int(df_heat["頁數"].max()), 1)
+    heat = (
+        alt.Chart(df_heat)
+        .mark_rect(cornerRadius=2, stroke="white", strokeWidth=1)
+        .encode(
+            x=alt.X("週:O", axis=None),
+            y=alt.Y("星期:O", sort=HEATMAP_WEEKDAYS, title=None),
+            color=alt.Color("頁數:Q", scale=alt.Scale(domain=[0, top], range=["#ebedf0", "#6f2dbd"]), legend=None),
+            tooltip=["日期", "頁數", "分鐘"],
+        )
+        .properties(width=720, height=110)
+        .facet(row=alt.Row("年:O", sort="descending", title=None))
+    )
+    st.altair_chart(heat)
+
 def render_calendar():
     render_topbar("閱讀行事曆")
     if error_message:
         st.error(f"⚠️ {error_message}")
         return
 
-    logs = fetch_logs()
-    todos = fetch_todos()
-    log_map = {}
-
-    for log in logs:
-        d = log["date"]
-        if d:
-            if d not in log_map:
-                log_map[d] = {"pages": 0, "mins": 0, "todos": []}
-            log_map[d]["pages"] += log["pages"]
-            log_map[d]["mins"] += log["mins"]
-
-    for task in todos:
-        d = task["due_date"]
-        if d and not task["done"]:
-            if d not in log_map:
-                log_map[d] = {"pages": 0, "mins": 0, "todos": []}
-            log_map[d]["todos"].append(task["name"])
-
     c_cal, c_detail = st.columns([3, 1.2], gap="large")
 
     with c_cal:
@@ -974,39 +3122,21 @@ def render_calendar():
         with col_ctrl2:
             curr_month = st.selectbox("月份", range(1, 13), index=datetime.now().month - 1)
 
-        cal = calendar.monthcalendar(curr_year, curr_month)
-        st.write("")
-
-        cols = st.columns(7)
-        days = ["日", "一", "二", "三", "四", "五", "六"]
-        for idx, d in enumerate(days):
-            cols[idx].markdown(f"<div style='text-align:center; color:#64748b; font-weight:bold;'>{d}</div>", unsafe_allow_html=True)
-
-        t_s = datetime.now().strftime("%Y-%m-%d")
-
-        for week in cal:
-            cols = st.columns(7)
-            for idx, day in enumerate(week):
-                with cols[idx]:
-                    if day != 0:
-                        d_obj = date(curr_year, curr_month, day)
-                        d_str = d_obj.strftime("%Y-%m-%d")
-                        is_today = "today" if d_str == t_s else ""
-                        content_html = f"<div class='cal-date-num'>{day}</div>"
-                        if d_str in log_map:
-                            data = log_map[d_str]
-                            if data["pages"] > 0:
-                                content_html += f"<div class='reading-block'>{data['pages']} <span>頁</span></div>"
-                            for t in data["todos"][:2]:
-                                content_html += f"<div class='todo-block'>📝 {t}</div>"
-                        st.markdown(f"<div class='cal-cell {is_today}'>{content_html}</div>", unsafe_allow_html=True)
+        # on_change="rerun" 讓分頁只執行選到的那一個，沒點開熱圖就不載入 pandas / altair
+        tab_month, tab_year = st.tabs(["📅 月曆", "🔥 年度熱圖"], key="cal_tab", on_change="rerun")
+        if tab_month.open:
+            with tab_month:
+                render_month_grid(curr_year, curr_month, calendar_month(curr_year, curr_month))
+        if tab_year.open:
+            with tab_year:
+                render_heatmap(curr_year)
 
     with c_detail:
         st.markdown("### 📅 選取日期")
         sel_date = st.date_input("日期", value=datetime.now())
         sel_date_str = sel_date.strftime("%Y-%m-%d")
 
-        day_data = log_map.get(sel_date_str, {"pages": 0, "mins": 0, "todos": []})
+        day_data = calendar_month(sel_date.year, sel_date.month).get(sel_date_str, {"pages": 0, "mins": 0, "todos": []})
 
         d1, d2 = st.columns(2)
         with d1:
@@ -1021,34 +3151,44 @@ def render_calendar():
         st.markdown("#### 📝 新增閱讀紀錄")
 
         with st.form("add_log"):
-            book_opts = {b["title"]: b["id"] for b in books}
+            book_opts = {b["title"]: b["id"] for b in book_choices()}
             sel_book_name = st.selectbox("選擇書籍", list(book_opts.keys())) if book_opts else st.selectbox("選擇書籍", ["無書籍"])
             l1, l2 = st.columns(2)
             in_pages = l1.number_input("閱讀頁數", min_value=0, step=1)
             in_mins = l2.number_input("閱讀分鐘", min_value=0, step=5)
             if st.form_submit_button("＋ 新增紀錄", type="primary", width="stretch"):
                 if book_opts and add_log_to_notion(sel_date, book_opts[sel_book_name], in_pages, in_mins):
-                    st.success("已儲存")
-                    time.sleep(1)
-                    refresh_data()
+                    st.toast("已儲存", icon="✅")
+                    st.rerun()
 
 # =========================
 # 控制邏輯
 # =========================
-if "page" not in st.session_state:
-    st.session_state.page = "dashboard"
-
 render_sidebar()
-
-if st.session_state.page == "dashboard":
-    render_dashboard()
-elif st.session_state.page == "library":
-    render_library()
-elif st.session_state.page == "book_detail":
-    render_book_detail()
-elif st.session_state.page == "calendar":
-    render_calendar()
-elif st.session_state.page == "timer":
-    render_timer()
-elif st.session_state.page == "todo":
-    render_todo()
+if finish_timer():
+    st.toast("⏰ 專注時間到！", icon="✅")
+
+with get_metrics().timer("page_render_seconds", page=st.session_state.page):
+    if st.session_state.page == "dashboard":
+        render_dashboard()
+    elif st.session_state.page == "library":
+        render_library()
+    elif st.session_state.page == "book_detail":
+        render_book_detail()
+    elif st.session_state.page == "calendar":
+        render_calendar()
+    elif st.session_state.page == "timer":
+        render_timer()
+    elif st.session_state.page == "todo":
+        render_todo()
+    elif st.session_state.page == "import":
+        render_import()
+
+# 只在背景更新進行中才輪詢（只比對版本號，不會多打 Notion）；
+# 計時中不輪詢（伺服器不必做事），對話框開著也不要，整頁重畫會把它關掉
+polling = not DEMO_MODE and not st.session_state.get("timer_deadline") and not st.session_state.dialog_open
+if polling and (refreshing() or snapshot_changed()):
+    st.fragment(watch_refresh, run_every=REFRESH_POLL_SECONDS)()
+
+render_metrics_panel()
+get_metrics().finish_rerun(rerun_started, rerun_notion_calls, st.session_state.page)
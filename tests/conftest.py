@@ -0,0 +1,76 @@
+# =========================
+# 測試共用：啟動 bench/notion_stub.py 的假 Notion API，gallery.py 在 bare mode 下匯入
+# =========================
+import logging
+import os
+import sys
+import tempfile
+import time
+import warnings
+
+import pytest
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(TESTS_DIR)
+GALLERY_PATH = os.path.join(REPO_DIR, "gallery.py")
+sys.path.insert(0, os.path.join(REPO_DIR, "bench"))
+
+import notion_stub
+
+STUB_SIZE = {"books": 100, "log_years": 1, "logs_per_day": 2, "todos": 50}
+
+@pytest.fixture(scope="session")
+def stub():
+    server = notion_stub.serve(notion_stub.build_databases(**STUB_SIZE))
+    workdir = tempfile.mkdtemp(prefix="gallery-test-")
+    os.environ.update(
+        NOTION_TOKEN="test",
+        NOTION_API_BASE=server.base_url,
+        NOTION_DATABASE_ID=notion_stub.BOOK_DB,
+        NOTION_LOG_ID=notion_stub.LOG_DB,
+        NOTION_TODO_ID=notion_stub.TODO_DB,
+        NOTION_MIRROR_PATH=os.path.join(workdir, "mirror.sqlite3"),
+        NOTION_RATE_PER_SEC="10000",
+        ACCESS_PASSWORD="test",
+    )
+    yield server
+    server.shutdown()
+
+@pytest.fixture
+def notion(stub):
+    # 每個測試都從同一份假資料開始，前一個測試的寫入不會留下來
+    stub.databases = notion_stub.build_databases(**STUB_SIZE)
+    return stub
+
+@pytest.fixture(scope="session")
+def gallery(stub):
+    # bare mode 下每個元件都會警告沒有 ScriptRunContext
+    import streamlit
+
+    for name in list(logging.root.manager.loggerDict):
+        if name.startswith("streamlit"):
+            logging.getLogger(name).disabled = True
+    warnings.filterwarnings("ignore", module="streamlit")
+    sys.path.insert(0, REPO_DIR)
+    import gallery
+
+    # bare mode 下 st.form 直接回傳主畫面的 DeltaGenerator，登入表單會一直掛在上面，
+    # 之後同一個行程裡的 AppTest 會以為整頁都在表單裡
+    streamlit._main._form_data = None
+    # gallery.py 會讀 .env（override=True）；沒連到假伺服器就不要往下跑
+    if gallery.NOTION_API_BASE != stub.base_url or gallery.BOOK_DS_ID != notion_stub.BOOK_DB:
+        pytest.exit("gallery.py 沒有連到假伺服器（.env 覆蓋了 NOTION_API_BASE 或資料庫 ID？）")
+    return gallery
+
+@pytest.fixture
+def app(stub):
+    from streamlit.testing.v1 import AppTest
+
+    def open_page(page):
+        at = AppTest.from_file(GALLERY_PATH, default_timeout=60)
+        at.session_state["password_correct"] = True
+        at.session_state["last_activity"] = time.time()
+        at.session_state["page"] = page
+        return at.run()
+
+    return open_page
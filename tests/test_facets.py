@@ -0,0 +1,43 @@
+class Store:
+    def __init__(self, rows, version=1):
+        self.rows = {row["id"]: row for row in rows}
+        self.version = version
+
+def book(doc_id, status, category="文學", genre="小說", tags=()):
+    return {"id": doc_id, "status": status, "category": category, "genre": genre, "tags": list(tags)}
+
+BOOKS = [
+    book("a", "已讀", tags=["推薦"]),
+    book("b", "已讀", category="商業", tags=["推薦", "經典"]),
+    book("c", "想讀", tags=["經典"]),
+    book("d", "閱讀中", category="商業"),
+]
+NONE = {"status": None, "category": None, "genre": None, "tags": None}
+
+def test_counts_apply_every_other_facet(gallery):
+    facets = gallery.FacetIndex().sync_from(Store(BOOKS))
+    selected = {**NONE, "status": "已讀"}
+    assert facets.counts("status", selected) == {"已讀": 2, "想讀": 1, "閱讀中": 1}
+    assert facets.counts("category", selected) == {"文學": 1, "商業": 1}
+    assert facets.counts("tags", selected) == {"推薦": 2, "經典": 1}
+    assert [b["id"] for b in facets.select(facets.mask(selected))] == ["a", "b"]
+
+def test_counts_within_search_results(gallery):
+    facets = gallery.FacetIndex().sync_from(Store(BOOKS))
+    base = facets.ids_mask(["b", "c", "missing"])
+    assert facets.counts("tags", NONE, base) == {"推薦": 1, "經典": 2}
+    assert [b["id"] for b in facets.select(facets.mask({**NONE, "tags": "經典"}, base=base))] == ["b", "c"]
+
+def test_old_state_stays_consistent_after_a_new_version(gallery):
+    index = gallery.FacetIndex()
+    store = Store(BOOKS)
+    old = index.sync_from(store)
+    assert index.sync_from(store) is old
+
+    store.rows = {"d": BOOKS[3]}
+    store.version += 1
+    new = index.sync_from(store)
+    assert new is not old
+    assert [b["id"] for b in new.select(new.mask({**NONE, "category": "商業"}))] == ["d"]
+    # 換版本前拿到的那一份照樣可以用，不會拿新的 bitset 去對舊的書單
+    assert [b["id"] for b in old.select(old.mask({**NONE, "category": "商業"}))] == ["b", "d"]
@@ -0,0 +1,37 @@
+import hashlib
+import io
+
+import pytest
+
+TITLES = [f"匯入測試 {i}" for i in range(1, 31)]
+CSV = ("title,author\n" + "".join(f"{t},作者\n" for t in TITLES) + ",沒有書名\n").encode("utf-8")
+
+class Interrupted(Exception):
+    pass
+
+def interrupt_after_first_batch(done, total):
+    raise Interrupted
+
+def imported_titles(gallery):
+    store = gallery.DeltaSync("books", **gallery.SYNC_DATASETS["books"])
+    store.sync(full=True)
+    return sorted(r["title"] for r in store.rows.values() if r["title"].startswith("匯入測試"))
+
+def test_rerun_skips_rows_already_written(gallery, notion):
+    with pytest.raises(Interrupted):
+        gallery.run_import("books", io.BytesIO(CSV), "books.csv", [], on_progress=interrupt_after_first_batch)
+    mirror = gallery.get_mirror()
+    job = "books:" + hashlib.sha1(CSV).hexdigest()[:16]
+    # 中斷前已送出的寫入都要記進 import_progress，不然重跑會重複建立
+    first = mirror.imported_rows(job)
+    assert first and first < set(range(1, 31))
+    assert len(imported_titles(gallery)) == len(first)
+
+    result = gallery.run_import("books", io.BytesIO(CSV), "books.csv", [])
+    assert result["job"] == job
+    assert result["total"] == 31
+    assert result["skipped"] == len(first)
+    assert result["imported"] == 30 - len(first)
+    assert [f["row"] for f in result["failed"]] == [31]
+    assert mirror.imported_rows(job) == set(range(1, 31))
+    assert imported_titles(gallery) == sorted(TITLES)
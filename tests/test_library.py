@@ -0,0 +1,31 @@
+def click(at, label):
+    next(b for b in at.button if b.label == label).click()
+    return at.run()
+
+def test_back_from_detail_keeps_filters_and_page(app):
+    at = app("library")
+    at.text_input(key="lib_q").set_value("作者").run()
+    at.selectbox(key="lib_status").set_value("已讀").run()
+    at.selectbox(key="lib_sort").set_value("書名 A→Z").run()
+    at.button(key="lib_next").click().run()
+    assert at.session_state["lib_page"] == 1
+    shown = [b.key for b in at.button if (b.key or "").startswith("btn_")]
+
+    next(b for b in at.button if b.key == shown[0]).click().run()
+    assert at.session_state["page"] == "book_detail"
+    click(at, "← 返回書庫")
+
+    assert not at.exception
+    assert at.session_state["page"] == "library"
+    assert at.session_state["lib_page"] == 1
+    assert at.text_input(key="lib_q").value == "作者"
+    assert at.selectbox(key="lib_status").value == "已讀"
+    assert at.selectbox(key="lib_sort").value == "書名 A→Z"
+    assert [b.key for b in at.button if (b.key or "").startswith("btn_")] == shown
+
+def test_changing_a_filter_goes_back_to_first_page(app):
+    at = app("library")
+    at.button(key="lib_next").click().run()
+    assert at.session_state["lib_page"] == 1
+    at.selectbox(key="lib_genre").set_value("小說").run()
+    assert at.session_state["lib_page"] == 0
@@ -0,0 +1,40 @@
+class Store:
+    def __init__(self, rows, version=1):
+        self.rows = {row["id"]: row for row in rows}
+        self.version = version
+
+def book(doc_id, title, author="", tags=(), publisher="", summary=""):
+    return {"id": doc_id, "title": title, "author": author, "tags": list(tags), "publisher": publisher, "summary": summary}
+
+BOOKS = [
+    book("a", "時間的旅人", author="作者1"),
+    book("b", "時間簡史", author="霍金"),
+    book("c", "城市", author="作者1", summary="關於時間"),
+    book("d", "Python 入門", tags=["程式"]),
+]
+
+def test_terms_can_match_different_fields(gallery):
+    index = gallery.SearchIndex()
+    index.sync_from(Store(BOOKS))
+    assert index.search("時間 作者1") == ["a", "c"]
+    assert index.search("時間") == ["a", "b", "c"]
+    assert index.search("python 程式") == ["d"]
+    assert index.search("時間 不存在") == []
+
+def test_scan_matches_the_index_before_it_is_built(gallery):
+    index = gallery.SearchIndex()
+    for q in ("時間 作者1", "時間", "python", "史"):
+        built = gallery.SearchIndex()
+        built.sync_from(Store(BOOKS))
+        assert sorted(index.scan(q, BOOKS)) == sorted(built.search(q))
+
+def test_index_follows_store_versions(gallery):
+    index = gallery.SearchIndex()
+    store = Store(BOOKS)
+    index.sync_from(store)
+    assert index.search("霍金") == ["b"]
+    store.rows["b"] = book("b", "時間簡史", author="史蒂芬")
+    store.version += 1
+    index.sync_from(store)
+    assert index.search("霍金") == []
+    assert index.search("史蒂芬") == ["b"]